@@ -1,10 +1,13 @@
 import pandas as pd
 import logging
 import plotly.express as px
-from utils.graph_utils import get_graph_time_values, color_seq
-from utils.job_utils import nodata_graph
+from utils.graph_utils import get_graph_time_values, get_graph_time_window_start, color_seq
+from utils.job_utils import nodata_graph, timeout_graph
 import time
+import asyncio
 import cache_manager.cache_facade as cf
+import cache_manager.async_cache_facade as acf
+from cache_manager.cx_common import env_aggregation_mode
 
 def commits_over_time_tool(repolist, interval="M"):
     graph = commits_over_time_graph(repolist, interval)
@@ -12,40 +15,162 @@ def commits_over_time_tool(repolist, interval="M"):
     description = "Visualizes the number of commits added to the project.\n Commits are counted relative to a user-selected time window."
     return graph, title, description
 
+def _cache_read_args(interval):
+    # only the columns process_data uses, only the commits the graph's time window shows.
+    return {
+        "columns": ["author_date", "commit_hash"],
+        "time_column": "author_date",
+        "start": get_graph_time_window_start(interval),
+    }
+
+
+def _bucket_read_args(interval):
+    # distinct commits per time-bin, counted in the cache database.
+    return {
+        "time_column": "author_date",
+        "interval": interval,
+        "count_column": "commit_hash",
+        "start": get_graph_time_window_start(interval),
+    }
+
+
+def _rollup_read_args(interval):
+    # commits per day, summed per time-bin in the cache database.
+    return {
+        "interval": interval,
+        "start": get_graph_time_window_start(interval),
+    }
+
+
+def _promote_collection(func_name, repos):
+    # a graph request is blocked on these repos, collect them first.
+    from celery_app import promote_collection
+
+    try:
+        promote_collection(func_name, repos)
+    except Exception as e:
+        logging.error(f"COMMITS_OVER_TIME_VIZ - COULDN'T PROMOTE COLLECTION: {e}")
+
+
 def commits_over_time_graph(repolist, interval="M"):
     # wait for data to asynchronously download and become available.
-    while not_cached := cf.get_uncached(func_name="commits", repolist=repolist):
-        logging.warning(f"COMMITS_OVER_TIME_VIZ - WAITING ON DATA TO BECOME AVAILABLE")
-        time.sleep(0.5)
+    if not_cached := cf.wait_until_cached(func_name="commits", repolist=repolist, on_pending=_promote_collection):
+        logging.warning(f"COMMITS_OVER_TIME_VIZ - {len(not_cached)} REPOS NOT AVAILABLE")
+        return timeout_graph
 
     # data ready.
     start = time.perf_counter()
     logging.warning("COMMITS_OVER_TIME_VIZ - START")
 
-    # GET ALL DATA FROM POSTGRES CACHE
-    df = cf.retrieve_from_cache(
+    if env_aggregation_mode == "rollup":
+        # GET THE PER-BIN COMMIT COUNTS FROM THE DAILY ROLLUP
+        df_created = process_rollup(
+            cf.retrieve_rollup_buckets(tablename="commits_query", repolist=repolist, **_rollup_read_args(interval))
+        )
+    elif env_aggregation_mode == "sql":
+        # GET THE PER-BIN COMMIT COUNTS FROM POSTGRES CACHE
+        df_created = process_buckets(
+            cf.retrieve_time_buckets(tablename="commits_query", repolist=repolist, **_bucket_read_args(interval))
+        )
+    else:
+        # GET THE DATA THE GRAPH SHOWS FROM POSTGRES CACHE
+        df = cf.retrieve_from_cache(
+            tablename="commits_query",
+            repolist=repolist,
+            **_cache_read_args(interval),
+        )
+        # function for all data pre processing
+        df_created = process_data(df, interval) if not df.empty else df
+
+    # test if there is data
+    if df_created.empty:
+        logging.warning("COMMITS OVER TIME - NO DATA AVAILABLE")
+        return nodata_graph
+
+    fig = create_figure(df_created, interval)
+
+    logging.warning(f"COMMITS_OVER_TIME_VIZ - END - {time.perf_counter() - start}")
+    return fig
+
+
+async def commits_over_time_data_async(repolist, interval="M"):
+    """
+    Waits on and reads the per-bin commit counts through the async facade.
+    Returns an empty frame if there's no data.
+
+    Raises:
+        TimeoutError: if some repos weren't collected in time.
+    """
+    # wait for data to asynchronously download and become available.
+    if not_cached := await acf.wait_until_cached(func_name="commits", repolist=repolist, on_pending=_promote_collection):
+        raise TimeoutError(f"commits data for {len(not_cached)} repos is not available")
+
+    # data ready.
+    logging.warning("COMMITS_OVER_TIME_VIZ - START")
+
+    if env_aggregation_mode == "rollup":
+        # GET THE PER-BIN COMMIT COUNTS FROM THE DAILY ROLLUP
+        return process_rollup(
+            await acf.retrieve_rollup_buckets(tablename="commits_query", repolist=repolist, **_rollup_read_args(interval))
+        )
+    elif env_aggregation_mode == "sql":
+        # GET THE PER-BIN COMMIT COUNTS FROM POSTGRES CACHE
+        return process_buckets(
+            await acf.retrieve_time_buckets(tablename="commits_query", repolist=repolist, **_bucket_read_args(interval))
+        )
+
+    # GET THE DATA THE GRAPH SHOWS FROM POSTGRES CACHE
+    df = await acf.retrieve_from_cache(
         tablename="commits_query",
         repolist=repolist,
+        **_cache_read_args(interval),
     )
+    # pandas work is CPU-bound, keep it off the event loop.
+    return await asyncio.to_thread(process_data, df, interval) if not df.empty else df
+
+
+async def commits_over_time_graph_async(repolist, interval="M"):
+    """
+    Non-blocking version of commits_over_time_graph for the API event loop.
+    Waits on and reads the cache through the async facade, and builds the
+    figure in a worker thread.
+    """
+    start = time.perf_counter()
+    try:
+        df_created = await commits_over_time_data_async(repolist, interval)
+    except TimeoutError as e:
+        logging.warning(f"COMMITS_OVER_TIME_VIZ - {e}")
+        return timeout_graph
 
     # test if there is data
-    if df.empty:
+    if df_created.empty:
         logging.warning("COMMITS OVER TIME - NO DATA AVAILABLE")
         return nodata_graph
 
-    # function for all data pre processing
-    df_created = process_data(df, interval)
-
-    fig = create_figure(df_created, interval)
+    # plotly work is CPU-bound, keep it off the event loop.
+    fig = await asyncio.to_thread(create_figure, df_created, interval)
 
     logging.warning(f"COMMITS_OVER_TIME_VIZ - END - {time.perf_counter() - start}")
     return fig
 
 
+async def commits_over_time_series_async(repolist, interval="M"):
+    """
+    Like commits_over_time_graph_async, but returns the plotted series
+    itself instead of a figure, for clients that draw the graph.
+    """
+    start = time.perf_counter()
+    series = create_series(await commits_over_time_data_async(repolist, interval), interval)
+    logging.warning(f"COMMITS_OVER_TIME_SERIES - END - {time.perf_counter() - start}")
+    return series
+
+
 def process_data(df: pd.DataFrame, interval):
-    # convert to datetime objects with consistent column name
-    # incoming value should be a posix integer.
-    df["author_date"] = pd.to_datetime(df["author_date"], utc=True)
+    # consistent column name
+    # incoming value is already datetime64 from the typed cache schema,
+    # only parse if an older cache handed back strings.
+    if not pd.api.types.is_datetime64_any_dtype(df["author_date"]):
+        df["author_date"] = pd.to_datetime(df["author_date"], utc=True)
     df.rename(columns={"author_date": "created_at"}, inplace=True)
 
     # variable to slice on to handle weekly period edge case
@@ -69,6 +194,28 @@ def process_data(df: pd.DataFrame, interval):
     return df_created
 
 
+def process_buckets(df_buckets: pd.DataFrame):
+    # same shape process_data produces: bin start as 'Date', distinct commits as 'commit_hash'
+    return df_buckets.rename(columns={"bucket": "Date", "count": "commit_hash"})
+
+
+def process_rollup(df_buckets: pd.DataFrame):
+    # same shape process_data produces, from the summed daily rollup
+    return df_buckets.rename(columns={"bucket": "Date", "commits": "commit_hash"})
+
+
+def create_series(df_created: pd.DataFrame, interval):
+    # the data and axes of the figure create_figure draws, as plain columns
+    x_r, x_name, _, _ = get_graph_time_values(interval)
+    return {
+        "x": df_created["Date"].dt.strftime("%Y-%m-%d").tolist() if not df_created.empty else [],
+        "y": df_created["commit_hash"].astype(int).tolist() if not df_created.empty else [],
+        "x_range": x_r,
+        "x_title": x_name,
+        "y_title": "Number of Commits",
+    }
+
+
 def create_figure(df_created: pd.DataFrame, interval):
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(interval)
@@ -0,0 +1,94 @@
+"""
+Access log of repo and org selections, for prewarming the cache.
+
+After a deploy or a cache wipe, the first users of popular orgs used to
+pay the full collection cost. The API records every selection a user
+requests here, and a periodic task (see celery_app.prewarm_cache_task)
+collects the most popular ones in the background and keeps them fresh.
+
+Selections are counted per day in sorted sets in the coordination
+redis (the celery broker), which unlike redis-cache survives restarts
+and doesn't evict; each day's set expires once it's older than
+SELECTION_LOG_DAYS. A selection that is exactly an org's repos is
+logged as the org, so prewarming follows the org's current repos.
+"""
+import logging
+import os
+from datetime import date, timedelta
+
+import redis
+
+from .cx_common import env_selection_log_days
+
+_client: redis.StrictRedis | None = None
+
+
+def _get_client() -> redis.StrictRedis:
+    global _client
+    if _client is None:
+        _client = redis.StrictRedis(host=os.getenv("REDIS_HOST", "redis"), port=6379, db=0, decode_responses=True)
+    return _client
+
+
+def _day_key(day: date) -> str:
+    return f"selection-hits:{day.isoformat()}"
+
+
+def selection_key(repo_ids: list[int], org: str | None = None) -> str:
+    """The access log member of a selection: 'org:<name>' or 'repos:<sorted ids>'."""
+    if org is not None:
+        return f"org:{org}"
+    return "repos:" + ",".join(str(r) for r in sorted(set(int(r) for r in repo_ids)))
+
+
+def parse_selection(key: str) -> tuple[str, str | list[int]]:
+    """
+    Inverse of selection_key.
+
+    Returns:
+        ("org", name) or ("repos", [repo_id, ...])
+    """
+    kind, _, value = key.partition(":")
+    if kind == "org":
+        return "org", value
+    return "repos", [int(r) for r in value.split(",") if r]
+
+
+def record_selection(repo_ids: list[int], org: str | None = None) -> None:
+    """
+    Counts one request of a selection. Never raises: the access log is
+    an optimization and mustn't fail the request.
+    """
+    if not repo_ids and org is None:
+        return
+    key = _day_key(date.today())
+    try:
+        with _get_client().pipeline(transaction=False) as pipe:
+            pipe.zincrby(key, 1, selection_key(repo_ids, org))
+            pipe.expire(key, (env_selection_log_days + 1) * 86400)
+            pipe.execute()
+    except redis.RedisError as e:
+        logging.error(f"ACCESS LOG - COULDN'T RECORD SELECTION: {e}")
+
+
+def top_selections(n: int, days: int = env_selection_log_days) -> list[tuple[str, float]]:
+    """
+    The {n} selections requested most often over the last {days} days.
+
+    Returns:
+        list[tuple[str, float]]: (selection key, requests), most requested first
+    """
+    if n <= 0:
+        return []
+    today = date.today()
+    keys = [_day_key(today - timedelta(days=d)) for d in range(days)]
+    client = _get_client()
+    # summed into a short-lived scratch key; ZUNION needs redis 6.2.
+    scratch = f"selection-hits:top:{os.getpid()}"
+    with client.pipeline(transaction=True) as pipe:
+        pipe.zunionstore(scratch, keys)
+        pipe.expire(scratch, 60)
+        pipe.zrevrange(scratch, 0, n - 1, withscores=True)
+        pipe.delete(scratch)
+        _, _, top, _ = pipe.execute()
+    return [(key, score) for key, score in top]
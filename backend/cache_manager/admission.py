@@ -0,0 +1,176 @@
+"""
+Admission control of queries against the Augur database.
+
+Celery is scaled to the number of vCPUs of the worker hosts, and nothing
+else bounds how many of those workers run heavy collection queries
+against the shared Augur database at the same time. Every query now
+has to hold one of a fixed number of slots of its query type first.
+
+Slots are a distributed counting semaphore in the coordination redis
+(the celery broker). Each held slot is a member of a sorted set per
+query type, scored with the time its lease runs out; a worker that
+dies holding a slot loses it when the lease expires. The redis-cache
+instance isn't used because it evicts keys under memory pressure.
+
+A query that can't get a slot within AUGUR_ADMISSION_TIMEOUT seconds is
+rejected with AdmissionRejected, and its celery task is retried later
+with backoff. Admissions, rejections and waiting time are counted per
+query type, see admission_stats.
+
+If redis is unavailable, queries are admitted without a slot rather
+than stopping collection.
+"""
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+import redis
+
+from .cx_common import env_augur_max_concurrent, env_augur_admission_timeout, env_augur_query_lease
+
+# removes expired leases, then takes a slot if one is free.
+# KEYS[1]: slots of the query type, ARGV: limit, lease seconds, token
+_ACQUIRE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    return 1
+end
+return 0
+"""
+
+_client: redis.StrictRedis | None = None
+_acquire_script = None
+
+
+class AdmissionRejected(TimeoutError):
+    """Raised when a query doesn't get a slot within AUGUR_ADMISSION_TIMEOUT seconds."""
+
+
+def _get_client() -> redis.StrictRedis:
+    global _client, _acquire_script
+    if _client is None:
+        _client = redis.StrictRedis(host=os.getenv("REDIS_HOST", "redis"), port=6379, db=0)
+        _acquire_script = _client.register_script(_ACQUIRE)
+    return _client
+
+
+def _slots_key(query_type: str) -> str:
+    return f"augur-slots:{query_type}"
+
+
+def _stats_key(query_type: str) -> str:
+    return f"augur-admission:{query_type}"
+
+
+def query_limit(query_type: str) -> int:
+    """Max concurrent augur queries of {query_type}, 0 if unlimited."""
+    override = os.getenv(f"AUGUR_MAX_CONCURRENT_QUERIES_{query_type.upper()}")
+    return int(override) if override else env_augur_max_concurrent
+
+
+def _record(client, query_type: str, outcome: str, waited: float, contended: bool) -> None:
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            pipe.sadd("augur-admission:types", query_type)
+            pipe.hincrby(_stats_key(query_type), outcome, 1)
+            pipe.hincrbyfloat(_stats_key(query_type), "wait_seconds_total", waited)
+            if contended:
+                pipe.hincrby(_stats_key(query_type), "waited", 1)
+            pipe.execute()
+    except redis.RedisError as e:
+        logging.error(f"{query_type} ADMISSION - COULDN'T RECORD STATS: {e}")
+
+
+@contextmanager
+def admit(query_type: str, timeout: float = env_augur_admission_timeout):
+    """
+    Holds a slot of {query_type} for the duration of the block.
+
+    Waits for a free slot for at most {timeout} seconds, polling with
+    jittered backoff.
+
+    Raises:
+        AdmissionRejected: if no slot was free in time.
+    """
+    limit = query_limit(query_type)
+    if limit <= 0:
+        yield
+        return
+
+    token = uuid4().hex
+    start = time.monotonic()
+    acquired = False
+    contended = False
+    try:
+        client = _get_client()
+        delay = 0.1
+        while not _acquire_script(keys=[_slots_key(query_type)], args=[limit, env_augur_query_lease, token]):
+            waited = time.monotonic() - start
+            if waited >= timeout:
+                logging.warning(f"{query_type} ADMISSION - REJECTED AFTER {waited:.1f}s, {limit} QUERIES RUNNING")
+                _record(client, query_type, "rejected", waited, contended=True)
+                raise AdmissionRejected(f"no augur query slot for {query_type} within {timeout}s")
+            contended = True
+            time.sleep(min(delay * random.uniform(0.5, 1.5), timeout - waited))
+            delay = min(delay * 2, 5.0)
+        acquired = True
+    except redis.RedisError as e:
+        logging.error(f"{query_type} ADMISSION - REDIS UNAVAILABLE, ADMITTING WITHOUT A SLOT: {e}")
+
+    if not acquired:
+        yield
+        return
+
+    waited = time.monotonic() - start
+    if waited > 1:
+        logging.warning(f"{query_type} ADMISSION - ADMITTED AFTER {waited:.1f}s")
+    _record(client, query_type, "admitted", waited, contended)
+    try:
+        yield
+    finally:
+        try:
+            client.zrem(_slots_key(query_type), token)
+        except redis.RedisError as e:
+            # the lease expires on its own.
+            logging.error(f"{query_type} ADMISSION - COULDN'T RELEASE SLOT: {e}")
+
+
+def admission_stats() -> dict[str, dict]:
+    """
+    Admission metrics of every query type that has been admitted or rejected.
+
+    Returns:
+        dict[str, dict]: query type -> limit, in_flight, admitted, waited,
+            rejected, wait_seconds_total and avg_wait_seconds
+    """
+    client = _get_client()
+    query_types = sorted(t.decode("utf-8") for t in client.smembers("augur-admission:types"))
+    now = time.time()
+    with client.pipeline(transaction=False) as pipe:
+        for query_type in query_types:
+            pipe.hgetall(_stats_key(query_type))
+            pipe.zcount(_slots_key(query_type), now, "+inf")
+        replies = pipe.execute()
+
+    stats = {}
+    for query_type, counters, in_flight in zip(query_types, replies[::2], replies[1::2]):
+        counters = {k.decode("utf-8"): float(v) for k, v in counters.items()}
+        admitted = int(counters.get("admitted", 0))
+        rejected = int(counters.get("rejected", 0))
+        wait_total = counters.get("wait_seconds_total", 0.0)
+        stats[query_type] = {
+            "limit": query_limit(query_type),
+            "in_flight": in_flight,
+            "admitted": admitted,
+            "waited": int(counters.get("waited", 0)),
+            "rejected": rejected,
+            "wait_seconds_total": wait_total,
+            "avg_wait_seconds": wait_total / (admitted + rejected) if admitted + rejected else 0.0,
+        }
+    return stats
@@ -0,0 +1,152 @@
+"""
+Columnar retrieval from the postgres cache.
+
+cache_facade.retrieve_from_cache originally fetched rows as python
+tuples and built a DataFrame from them, holding the tuples, the
+row list and the DataFrame in memory at once, and spending most of
+its time creating python objects.
+
+The ADBC postgres driver reads results with binary COPY straight
+into Arrow columns in C++, so no per-value python objects are made.
+Arrow tables convert to pandas with little or no copying.
+
+ADBC is an optional dependency (the 'arrow' extra). Without it,
+arrow_available() is False and callers use the row-based path.
+"""
+import logging
+
+try:
+    import adbc_driver_postgresql.dbapi as adbc_pg
+    import pyarrow as pa
+except ImportError:
+    adbc_pg = None
+    pa = None
+
+from .cx_common import (
+    cache_uri,
+    env_arrow_pool_size,
+    env_pool_max_idle,
+    env_pool_checkout_timeout,
+)
+from .cache_select import build_cache_select
+from .pools import ConnectionPool
+
+
+class ArrowConnectionPool(ConnectionPool):
+    """
+    ConnectionPool of ADBC connections to the cache.
+
+    ADBC connections aren't thread-safe and, like psycopg2 connections,
+    must not be used across fork(); the pool hands each one to a single
+    borrower at a time and forgets them after fork. Bounding them keeps
+    the columnar path within its own connection budget no matter how
+    many threads read at once.
+    """
+
+    def _connect(self):
+        return adbc_pg.connect(self._dsn)
+
+    def _is_open(self, conn):
+        # ADBC has no 'closed' flag; broken connections are discarded on return.
+        return True
+
+    def _is_reusable(self, conn):
+        # every borrow ends with a commit or rollback, see ConnectionPool.connection.
+        return True
+
+
+arrow_pool = (
+    ArrowConnectionPool(
+        name="arrow",
+        dsn=cache_uri,
+        max_size=env_arrow_pool_size,
+        max_idle=env_pool_max_idle,
+        checkout_timeout=env_pool_checkout_timeout,
+    )
+    if adbc_pg is not None
+    else None
+)
+
+
+def arrow_available() -> bool:
+    """Whether the ADBC driver and pyarrow are installed."""
+    return adbc_pg is not None
+
+
+def _lock_and_touch_pairs(cur, func_name: str, repolist: list[int]) -> None:
+    """ADBC version of cache_facade._lock_pairs_shared followed by
+    cache_facade._touch_pairs, in the cursor's transaction.
+    """
+    # repo ids are bound as an array literal; the driver binds scalars only.
+    repo_ids = "{" + ",".join(str(int(r)) for r in repolist) + "}"
+    cur.execute(
+        """
+        SELECT pg_advisory_xact_lock_shared(hashtext($1), r.repo_id)
+        FROM unnest($2::text::int[]) AS r(repo_id)
+        ORDER BY r.repo_id
+        """,
+        parameters=(func_name, repo_ids),
+    )
+    cur.fetchall()
+    cur.execute(
+        """
+        UPDATE cache_bookkeeping
+        SET ts_accessed = CURRENT_TIMESTAMP
+        WHERE cache_func = $1
+            AND repo_id = ANY($2::text::int[])
+            AND (ts_accessed IS NULL OR ts_accessed < CURRENT_TIMESTAMP - interval '1 minute')
+        """,
+        parameters=(func_name, repo_ids),
+    )
+
+
+def retrieve_arrow(
+    tablename: str,
+    repolist: list[int],
+    columns: list[str] | None = None,
+    time_column: str | None = None,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> "pa.Table":
+    """
+    For a given table in cache, get all results that have a
+    matching repo_id as an Arrow table.
+
+    Projection and filters are pushed into SQL the same way as in
+    cache_facade.retrieve_from_cache.
+
+    Takes the same shared (cache_func, repo_id) locks as the row-based
+    path and records the same access for eviction, in one transaction.
+
+    Raises:
+        RuntimeError: if the ADBC driver isn't installed.
+    """
+    if adbc_pg is None:
+        raise RuntimeError("columnar retrieval requires adbc-driver-postgresql and pyarrow")
+
+    func_name = tablename.removesuffix("_query")
+
+    with arrow_pool.connection() as conn:
+        with conn.cursor() as cur:
+            # the evictor can't drop these pairs while they're being read.
+            _lock_and_touch_pairs(cur, func_name, repolist)
+
+            cur.execute(build_cache_select(tablename, repolist, columns, time_column, start, end, filters))
+            logging.warning(f"{tablename} - LOADING DATA FROM CACHE (ARROW)")
+            table = cur.fetch_arrow_table()
+
+    logging.warning(f"{tablename} - DATA LOADED - {table.num_rows} rows, {table.num_columns} cols")
+    return table
+
+
+def arrow_to_pandas(table: "pa.Table"):
+    """
+    Converts a retrieved Arrow table to a DataFrame with minimal copying.
+
+    Blocks are split per column so no consolidation copy is made, and
+    Arrow buffers are released as soon as their column is converted,
+    so peak memory stays near one copy of the result. {table} must not
+    be used afterwards.
+    """
+    return table.to_pandas(split_blocks=True, self_destruct=True)
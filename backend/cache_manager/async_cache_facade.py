@@ -0,0 +1,379 @@
+"""
+Non-blocking counterpart of the read path in cache_facade, for use
+from the FastAPI event loop.
+
+cache_facade is built on psycopg2, which blocks the calling thread for
+the duration of every query. Called from an `async def` endpoint that
+blocks the whole uvicorn worker. The functions here run the same SQL
+over an asyncpg pool instead, so a request waiting on the cache yields
+the event loop to every other request.
+
+Collection (the write path) stays in cache_facade- it runs in Celery
+workers, where blocking is fine.
+"""
+import asyncio
+import logging
+import os
+import time
+
+import asyncpg
+import pandas as pd
+
+from .cx_common import (
+    env_dbname,
+    env_host,
+    env_user,
+    env_password,
+    env_port,
+    env_cache_pool_size,
+    env_pool_max_idle,
+    env_retrieval_mode,
+    env_ready_timeout,
+    env_ready_recheck,
+)
+from .arrow_cache import arrow_available
+from .hot_tier import hot_tier_enabled
+from . import readiness
+from .cache_select import build_cache_select, build_cache_bucket_count, build_rollup_bucket_sum
+from .rollups import DAILY_ROLLUPS
+from . import cache_facade
+
+# postgres type names for 'timestamp' and 'timestamptz'
+_TIMESTAMP_TYPES = {"timestamp", "timestamptz"}
+
+_pool: asyncpg.Pool | None = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool() -> asyncpg.Pool:
+    """
+    Returns the asyncpg pool of this process, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    host=env_host,
+                    port=int(env_port),
+                    user=env_user,
+                    password=env_password,
+                    database=env_dbname,
+                    min_size=0,
+                    max_size=env_cache_pool_size,
+                    max_inactive_connection_lifetime=env_pool_max_idle,
+                    # same session settings as the psycopg2 cache connections.
+                    server_settings={"timezone": "UTC"},
+                )
+                logging.warning("ASYNC CACHE POOL CREATED")
+    return _pool
+
+
+def pool_stats() -> dict | None:
+    """Metrics of the asyncpg pool of this process, None before it's created."""
+    if _pool is None:
+        return None
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "name": "cache-async",
+        "pid": os.getpid(),
+        "max_size": _pool.get_max_size(),
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+    }
+
+
+async def close_pool() -> None:
+    """Closes the asyncpg pool of this process, if any."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def get_uncached(func_name: str, repolist: list[int]) -> list[int]:
+    """
+    Async version of cache_facade.get_uncached.
+
+    Returns a list of repos that AREN'T resident in cache.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT cb.repo_id
+            FROM cache_bookkeeping cb
+            WHERE cb.cache_func = $1 AND cb.repo_id = ANY($2::int[])
+            """,
+            func_name,
+            list(repolist),
+        )
+
+    already_cached: set[int] = {r["repo_id"] for r in rows}
+    return list(set(repolist) - already_cached)
+
+
+async def wait_until_cached(
+    func_name: str, repolist: list[int], timeout: float = env_ready_timeout, on_pending=None
+) -> list[int]:
+    """
+    Async version of cache_facade.wait_until_cached. {on_pending} is a
+    blocking callable and is run in a worker thread.
+
+    Waiting yields the event loop; only collection events and the
+    periodic bookkeeping check wake it.
+
+    Returns:
+        list[int]: repos that still aren't cached- empty when all are.
+    """
+    deadline = time.monotonic() + timeout
+    subscription = None
+    try:
+        # subscribe before checking, so an event between the check and the wait isn't missed.
+        subscription = await readiness.subscribe_async(func_name)
+    except Exception as e:
+        logging.error(f"{func_name} - COLLECTION EVENTS UNAVAILABLE, RECHECKING BOOKKEEPING: {e}")
+
+    try:
+        pending = set(await get_uncached(func_name=func_name, repolist=repolist))
+        if pending and on_pending is not None:
+            await asyncio.to_thread(on_pending, func_name, sorted(pending))
+        failed = set()
+        next_check = time.monotonic() + env_ready_recheck
+        while pending - failed:
+            now = time.monotonic()
+            if now >= deadline:
+                logging.warning(f"{func_name} - GAVE UP WAITING ON {len(pending)} REPOS")
+                break
+
+            wait = min(deadline, next_check) - now
+            event = None
+            if subscription is not None:
+                try:
+                    event = readiness.parse_event(await subscription.get_message(timeout=wait))
+                except Exception as e:
+                    logging.error(f"{func_name} - COLLECTION EVENTS LOST, RECHECKING BOOKKEEPING: {e}")
+                    await subscription.aclose()
+                    subscription = None
+            else:
+                await asyncio.sleep(wait)
+
+            if event is not None:
+                repos = set(event["repo_ids"])
+                if event["status"] == "cached":
+                    pending -= repos
+                else:
+                    failed |= pending & repos
+            elif time.monotonic() >= next_check:
+                pending = set(await get_uncached(func_name=func_name, repolist=list(pending)))
+                next_check = time.monotonic() + env_ready_recheck
+
+        if failed & pending:
+            logging.warning(f"{func_name} - COLLECTION FAILED FOR {len(failed & pending)} REPOS")
+        return list(pending)
+    finally:
+        if subscription is not None:
+            await subscription.aclose()
+
+
+async def get_data_version(func_name: str, repolist: list[int]) -> str | None:
+    """
+    Async version of cache_facade.get_data_version.
+
+    Returns a bookkeeping-derived version of the cached data, None if any
+    of the repos isn't cached.
+    """
+    repos = set(repolist)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT count(*) AS count, max(cb.ts_cached) AS last_cached
+            FROM cache_bookkeeping cb
+            WHERE cb.cache_func = $1 AND cb.repo_id = ANY($2::int[])
+            """,
+            func_name,
+            list(repos),
+        )
+
+    if row["count"] != len(repos):
+        return None
+    return f"{row['count']}:{row['last_cached'].isoformat() if row['last_cached'] else ''}"
+
+
+async def _lock_and_touch_pairs(conn: asyncpg.Connection, func_name: str, repolist: list[int]) -> None:
+    """Async version of cache_facade._lock_pairs_shared followed by
+    cache_facade._touch_pairs, in the caller's transaction.
+    """
+    await conn.execute(
+        """
+        SELECT pg_advisory_xact_lock_shared(hashtext($1), r.repo_id)
+        FROM unnest($2::int[]) AS r(repo_id)
+        ORDER BY r.repo_id
+        """,
+        func_name,
+        list(repolist),
+    )
+    await conn.execute(
+        """
+        UPDATE cache_bookkeeping
+        SET ts_accessed = CURRENT_TIMESTAMP
+        WHERE cache_func = $1
+            AND repo_id = ANY($2::int[])
+            AND (ts_accessed IS NULL OR ts_accessed < CURRENT_TIMESTAMP - interval '1 minute')
+        """,
+        func_name,
+        list(repolist),
+    )
+
+
+async def retrieve_from_cache(
+    tablename: str,
+    repolist: list[int],
+    columns: list[str] | None = None,
+    time_column: str | None = None,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """
+    Async version of cache_facade.retrieve_from_cache, with the same
+    projection and filter arguments.
+
+    Takes the same shared (cache_func, repo_id) locks and records the
+    same access for eviction. Building the DataFrame is CPU-bound, so
+    it's done in a worker thread.
+
+    When columnar retrieval is available it's cheaper than decoding
+    asyncpg records, and with the redis hot tier most reads don't reach
+    postgres at all, so in both cases the whole read is handed to a
+    worker thread instead.
+    """
+    if (env_retrieval_mode == "arrow" and arrow_available()) or hot_tier_enabled():
+        return await asyncio.to_thread(
+            cache_facade.retrieve_from_cache, tablename, repolist, columns, time_column, start, end, filters
+        )
+
+    func_name = tablename.removesuffix("_query")
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # the evictor can't drop these pairs while they're being read.
+            await _lock_and_touch_pairs(conn, func_name, repolist)
+
+            stmt = await conn.prepare(
+                build_cache_select(tablename, repolist, columns, time_column, start, end, filters)
+            )
+            logging.warning(f"{tablename} - LOADING DATA FROM CACHE (ASYNC)")
+            attributes = stmt.get_attributes()
+            rows = await stmt.fetch()
+
+    columns = [attr.name for attr in attributes]
+    timestamp_columns = [attr.name for attr in attributes if attr.type.name in _TIMESTAMP_TYPES]
+    df = await asyncio.to_thread(_records_to_frame, rows, columns, timestamp_columns)
+    logging.warning(f"{tablename} - DATA LOADED - {df.shape} rows,cols")
+    return df
+
+
+async def retrieve_time_buckets(
+    tablename: str,
+    repolist: list[int],
+    time_column: str,
+    interval,
+    count_column: str | None = None,
+    distinct: bool = True,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """
+    Async version of cache_facade.retrieve_time_buckets.
+
+    The result is one row per bin, so it's read over asyncpg, unless the
+    redis hot tier is enabled; then the whole read goes through the tier
+    in a worker thread.
+    """
+    if hot_tier_enabled():
+        return await asyncio.to_thread(
+            cache_facade.retrieve_time_buckets,
+            tablename,
+            repolist,
+            time_column,
+            interval,
+            count_column,
+            distinct,
+            start,
+            end,
+            filters,
+        )
+
+    func_name = tablename.removesuffix("_query")
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # the evictor can't drop these pairs while they're being read.
+            await _lock_and_touch_pairs(conn, func_name, repolist)
+
+            logging.warning(f"{tablename} - LOADING BUCKETS FROM CACHE (ASYNC)")
+            rows = await conn.fetch(
+                build_cache_bucket_count(
+                    tablename, repolist, time_column, interval, count_column, distinct, start, end, filters
+                )
+            )
+
+    df = pd.DataFrame([tuple(r) for r in rows], columns=["bucket", "count"])
+    df["bucket"] = pd.to_datetime(df["bucket"], utc=True).dt.tz_localize(None)
+    logging.warning(f"{tablename} - BUCKETS LOADED - {len(df)} buckets")
+    return df
+
+
+async def retrieve_rollup_buckets(
+    tablename: str,
+    repolist: list[int],
+    interval,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """
+    Async version of cache_facade.retrieve_rollup_buckets.
+
+    With the redis hot tier enabled, the read goes through the tier in a
+    worker thread.
+    """
+    if hot_tier_enabled():
+        return await asyncio.to_thread(
+            cache_facade.retrieve_rollup_buckets, tablename, repolist, interval, start, end, filters
+        )
+
+    rollup = DAILY_ROLLUPS[tablename]
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # rollup rows are evicted with their pair, same locks as the cache table.
+            await _lock_and_touch_pairs(conn, rollup["cache_func"], repolist)
+
+            logging.warning(f"{rollup['table']} - LOADING BUCKETS FROM ROLLUP (ASYNC)")
+            rows = await conn.fetch(
+                build_rollup_bucket_sum(rollup["table"], repolist, interval, list(rollup["columns"]), start, end, filters)
+            )
+
+    df = pd.DataFrame([tuple(r) for r in rows], columns=["bucket", *rollup["columns"]])
+    df["bucket"] = pd.to_datetime(df["bucket"], utc=True).dt.tz_localize(None)
+    logging.warning(f"{rollup['table']} - BUCKETS LOADED - {len(df)} buckets")
+    return df
+
+
+def _records_to_frame(rows: list, columns: list[str], timestamp_columns: list[str]) -> pd.DataFrame:
+    df = pd.DataFrame([tuple(r) for r in rows], columns=columns)
+
+    # all-NULL or mixed timestamp columns stay 'object'; keep the datetime64 contract.
+    for col in timestamp_columns:
+        if df[col].dtype == object:
+            df[col] = pd.to_datetime(df[col], utc=True)
+    return df
@@ -21,17 +21,415 @@ We're not experts in the field of ORMs and DB drivers, and would be
 happy to be proven wrong about the apparent performance tradeoff.
 """
 import logging
+import queue
+import threading
+import time
+from datetime import datetime
 from uuid import uuid4
 import psycopg2 as pg
 from psycopg2.extras import execute_values
 from psycopg2 import sql as pg_sql
+from psycopg2 import errors as pg_errors
 import pandas as pd
 
 # requires relative import syntax "import .cx_common" because
 # other files importing cache_facade need to know how to resolve
 # .cx_common- interpreter is invoked at a higher level, so relative
 # import required.
-from .cx_common import db_cx_string, env_augur_schema, cache_cx_string
+from .cx_common import (
+    db_cx_string,
+    env_augur_schema,
+    cache_cx_string,
+    env_ingest_mode,
+    env_copy_format,
+    env_copy_buffer_chunks,
+    env_refresh_min_age,
+    env_size_budget_bytes,
+    env_inflight_policy,
+    env_inflight_timeout,
+    env_retrieval_mode,
+    env_ready_timeout,
+    env_ready_recheck,
+)
+from .pools import cache_pool, augur_pool
+from .arrow_cache import arrow_available, retrieve_arrow, arrow_to_pandas
+from .cache_select import build_cache_select, build_cache_bucket_count, build_rollup_bucket_sum
+from .rollups import DAILY_ROLLUPS, ROLLUP_TABLES, refresh_daily_rollups
+from .shared_scans import SHARED_SCANS
+from .collection_costs import AUGUR_REPO_SIZE_QUERY, augur_size_estimate, record_collection_costs
+from .hot_tier import hot_tier_enabled, read_through, read_through_selection, selection_tag, invalidate
+from . import readiness
+from . import admission
+
+# postgres type oids for 'timestamp' and 'timestamptz'
+_TIMESTAMP_OIDS = {1114, 1184}
+
+# cache functions whose queries accept a per-repo %(since)s lower bound
+# and can therefore be refreshed incrementally.
+#   watermark: SQL expression over the cache table whose max per repo is
+#       the high-water mark. The query only returns rows past it.
+#   replace_key: columns identifying a row that can change upstream (e.g. a
+#       PR that gets closed). Refreshed rows replace cached rows with the
+#       same key. Omitted for append-only data.
+INCREMENTAL_FUNCS = {
+    "commits": {"watermark": "committer_timestamp"},
+    "contributors": {"watermark": "created_at"},
+    "affiliation": {"watermark": "created_at"},
+    "prs": {
+        "watermark": "GREATEST(created_at, closed_at, merged_at)",
+        "replace_key": ("pull_request_id",),
+    },
+    "issues": {
+        "watermark": "GREATEST(created_at, closed_at)",
+        "replace_key": ("issue",),
+    },
+}
+
+
+class _BoundedCopyBuffer:
+    """
+    File-like pipe between a COPY TO STDOUT on augur and a
+    COPY FROM STDIN on the cache.
+
+    psycopg2's copy_expert writes to / reads from a file object,
+    so the producer (augur) runs in a thread and pushes chunks into
+    a bounded queue that the consumer (cache) drains. The bound keeps
+    at most {max_chunks} chunks in memory regardless of result size.
+    """
+
+    def __init__(self, max_chunks: int):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._leftover = b""
+        self._eof = False
+        self._cancelled = threading.Event()
+        self.producer_error = None
+
+    def write(self, data):
+        # called by augur cursor from the producer thread.
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        while True:
+            if self._cancelled.is_set():
+                raise IOError("COPY consumer cancelled")
+            try:
+                self._queue.put(data, timeout=0.5)
+                return len(data)
+            except queue.Full:
+                continue
+
+    def close_writer(self):
+        # sentinel tells the reader that the stream is finished.
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(None, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def read(self, size=-1):
+        # called by cache cursor from the consumer thread.
+        while not self._eof and (size < 0 or len(self._leftover) < size):
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+                break
+            self._leftover += chunk
+
+        if size < 0:
+            out, self._leftover = self._leftover, b""
+        else:
+            out, self._leftover = self._leftover[:size], self._leftover[size:]
+        return out
+
+
+def _copy_rows(augur_conn, cache_conn, query: str, vars: dict, target_table: str) -> None:
+    """Streams the result of {query} from augur into {target_table} with
+    COPY TO STDOUT / COPY FROM STDIN through a bounded buffer.
+
+    Rows never become python objects- the COPY stream is handed from
+    one connection to the other as raw bytes.
+    """
+    copy_options = "FORMAT binary" if env_copy_format == "binary" else "FORMAT csv"
+
+    # COPY (query) doesn't accept bind parameters, so the query is rendered client-side first.
+    with augur_conn.cursor() as augur_cur:
+        rendered_query = augur_cur.mogrify(query, vars).decode("utf-8")
+    copy_out = f"COPY ({rendered_query}) TO STDOUT WITH ({copy_options})"
+    copy_in = pg_sql.SQL("COPY {tbl_name} FROM STDIN WITH ({options})").format(
+        tbl_name=pg_sql.Identifier(target_table),
+        options=pg_sql.SQL(copy_options),
+    )
+
+    buffer = _BoundedCopyBuffer(max_chunks=env_copy_buffer_chunks)
+
+    def _produce():
+        try:
+            with augur_conn.cursor() as augur_cur:
+                augur_cur.copy_expert(copy_out, buffer)
+        except Exception as e:
+            buffer.producer_error = e
+        finally:
+            buffer.close_writer()
+
+    producer = threading.Thread(target=_produce, name=f"{target_table}-copy-out", daemon=True)
+    producer.start()
+
+    try:
+        with cache_conn.cursor() as cache_cur:
+            cache_cur.copy_expert(copy_in, buffer)
+    except Exception:
+        buffer.cancel()
+        raise
+    finally:
+        producer.join()
+
+    # a failed producer just looks like a short stream to the consumer,
+    # so the error has to be surfaced here, before anything is committed.
+    if buffer.producer_error is not None:
+        raise buffer.producer_error
+
+
+def _insert_rows(
+    augur_conn,
+    cache_conn,
+    query: str,
+    vars: dict,
+    target_table: str,
+    server_pagination: int,
+    client_pagination: int,
+) -> None:
+    """Pages the result of {query} from augur through a named cursor and
+    writes it into {target_table} with paginated INSERT statements.
+    """
+    with augur_conn.cursor(name=f"{target_table}-{uuid4()}") as augur_cur:
+        # set number of rows we want from primary db at a time
+        augur_cur.itersize = server_pagination
+
+        logging.warning(f"{target_table} -- CQR EXECUTING QUERY")
+
+        # execute query with named parameters
+        augur_cur.execute(query, vars)
+
+        logging.warning(f"{target_table} -- CQR COMPOSING SQL")
+        # compose SQL w/ table name
+        # ref: https://www.psycopg.org/docs/sql.html
+        composed_query = pg_sql.SQL(
+            "INSERT INTO {tbl_name} VALUES %s ON CONFLICT DO NOTHING".format(tbl_name=target_table)
+        ).as_string(cache_conn)
+
+        # iterate through pages of rows from server.
+        logging.warning(f"{target_table} -- CQR FETCHING AND STORING ROWS")
+        while rows := augur_cur.fetchmany(client_pagination):
+            if not rows:
+                # we're out of rows
+                break
+
+            # write available rows to cache.
+            with cache_conn.cursor() as cache_cur:
+                execute_values(
+                    cur=cache_cur,
+                    sql=composed_query,
+                    argslist=rows,
+                    page_size=client_pagination,
+                )
+
+
+def _lock_pairs_shared(cache_cur, func_name: str, repolist: list[int]) -> None:
+    """Takes transaction-scoped shared advisory locks on each (func_name, repo_id)
+    pair. Readers and writers share them; the evictor needs them exclusively,
+    so it skips pairs that are being read or written.
+    """
+    cache_cur.execute(
+        """
+        SELECT pg_advisory_xact_lock_shared(hashtext(%(cache_func)s), r.repo_id)
+        FROM unnest(%(repo_ids)s::int[]) AS r(repo_id)
+        ORDER BY r.repo_id
+        """,
+        {"cache_func": func_name, "repo_ids": list(repolist)},
+    )
+
+
+def _create_stage(cache_conn, target_table: str) -> str:
+    """Creates a transaction-scoped staging table shaped like {target_table}
+    that an incremental delta is loaded into before it's merged.
+    """
+    stage_table = f"{target_table}_stage"
+    with cache_conn.cursor() as cache_cur:
+        cache_cur.execute(
+            pg_sql.SQL("CREATE TEMP TABLE {stage} (LIKE {target}) ON COMMIT DROP").format(
+                stage=pg_sql.Identifier(stage_table),
+                target=pg_sql.Identifier(target_table),
+            )
+        )
+    return stage_table
+
+
+def _merge_stage(cache_conn, stage_table: str, target_table: str, replace_key: tuple[str] | None) -> None:
+    """Appends the staged delta to {target_table}. Cached rows that share
+    {replace_key} with a staged row are outdated and are removed first.
+    """
+    with cache_conn.cursor() as cache_cur:
+        if replace_key:
+            cache_cur.execute(
+                pg_sql.SQL("DELETE FROM {target} t USING {stage} s WHERE t.repo_id = s.repo_id AND {key_match}").format(
+                    target=pg_sql.Identifier(target_table),
+                    stage=pg_sql.Identifier(stage_table),
+                    key_match=pg_sql.SQL(" AND ").join(
+                        pg_sql.SQL("t.{col} = s.{col}").format(col=pg_sql.Identifier(k)) for k in replace_key
+                    ),
+                )
+            )
+            logging.warning(f"{target_table} -- CQR REPLACED {cache_cur.rowcount} OUTDATED ROWS")
+
+        cache_cur.execute(
+            pg_sql.SQL("INSERT INTO {target} SELECT * FROM {stage}").format(
+                target=pg_sql.Identifier(target_table),
+                stage=pg_sql.Identifier(stage_table),
+            )
+        )
+        logging.warning(f"{target_table} -- CQR APPENDED {cache_cur.rowcount} NEW ROWS")
+
+
+def _update_watermarks(cache_conn, func_name: str, source_table: str, watermark: str, repolist: list[int]) -> None:
+    """Raises the bookkeeping watermark of each (func_name, repo_id) pair to
+    the max of {watermark} over the rows of {source_table}.
+
+    Every pair is marked as refreshed, including those without new rows.
+    """
+    with cache_conn.cursor() as cache_cur:
+        cache_cur.execute(
+            pg_sql.SQL(
+                """
+                UPDATE cache_bookkeeping cb
+                SET watermark = GREATEST(cb.watermark, w.watermark),
+                    ts_cached = CURRENT_TIMESTAMP
+                FROM (
+                    SELECT r.repo_id, max({watermark}) AS watermark
+                    FROM unnest(%(repo_ids)s::int[]) AS r(repo_id)
+                    LEFT JOIN {source} s ON s.repo_id = r.repo_id
+                    GROUP BY r.repo_id
+                ) w
+                WHERE cb.cache_func = %(cache_func)s AND cb.repo_id = w.repo_id
+                """
+            ).format(
+                # watermark is an expression from INCREMENTAL_FUNCS, not user input.
+                watermark=pg_sql.SQL(watermark),
+                source=pg_sql.Identifier(source_table),
+            ),
+            {"repo_ids": list(repolist), "cache_func": func_name},
+        )
+
+
+def _load_rows(
+    augur_conn,
+    cache_conn,
+    query: str,
+    vars: dict,
+    begin,
+    label: str,
+    ingest_mode: str = env_ingest_mode,
+    server_pagination: int = 2000,
+    client_pagination: int = 2000,
+) -> str:
+    """Begins the cache transaction with {begin}(cache_conn), which takes the
+    locks and returns the table to load into, and loads the result of {query}
+    into it.
+
+    With {ingest_mode} "copy" the rows are streamed with COPY; if that fails
+    both transactions are rolled back, {begin} runs again and the rows are
+    re-read with the paginated INSERT path.
+
+    Returns:
+        str: the table the rows were loaded into
+    """
+    load_table = begin(cache_conn)
+
+    if ingest_mode == "copy":
+        try:
+            logging.warning(f"{label} -- CQR COPYING ROWS")
+            _copy_rows(augur_conn, cache_conn, query, vars, load_table)
+            return load_table
+        except Exception as e:
+            logging.error(f"{label} -- CQR COPY FAILED, FALLING BACK TO INSERT: {e}")
+            cache_conn.rollback()
+            augur_conn.rollback()
+            # rollback released the locks and dropped any temp tables.
+            load_table = begin(cache_conn)
+
+    _insert_rows(augur_conn, cache_conn, query, vars, load_table, server_pagination, client_pagination)
+    return load_table
+
+
+def _record_pairs(
+    cache_conn,
+    func_name: str,
+    target_table: str,
+    changed_table: str,
+    repolist: list[int],
+    watermark: str | None,
+    incremental: bool = False,
+) -> None:
+    """Brings everything derived from {target_table} in step with rows of
+    {repolist} that were just written to it: daily rollups, collection costs,
+    bookkeeping and watermarks. {changed_table} holds the written rows- the
+    staged delta of a refresh, else {target_table} itself.
+
+    A refresh ({incremental}) only updates existing bookkeeping rows: a
+    delta must never make a pair count as fully cached.
+
+    Must run in the transaction that wrote the rows.
+    """
+    with cache_conn.cursor() as cache_cur:
+        # keep the daily rollups in step with the rows they summarize.
+        refresh_daily_rollups(cache_cur, target_table, changed_table, repolist)
+        # and the cost estimates used to shard later collections.
+        record_collection_costs(cache_cur, func_name, target_table, repolist)
+
+        logging.warning(f"{target_table} -- CQR UPDATING BOOKKEEPING")
+        if incremental:
+            cache_cur.execute(
+                """
+                UPDATE cache_bookkeeping
+                SET ts_cached = CURRENT_TIMESTAMP
+                WHERE cache_func = %(cache_func)s AND repo_id = ANY(%(repo_ids)s::int[])
+                """,
+                {"cache_func": func_name, "repo_ids": list(repolist)},
+            )
+        else:
+            # after all data has successfully been written to cache from the primary db,
+            # insert record of existence for each (cache_func, repo_id) pair.
+            execute_values(
+                cur=cache_cur,
+                sql="""
+                INSERT INTO cache_bookkeeping (cache_func, repo_id)
+                VALUES %s
+                ON CONFLICT (cache_func, repo_id) DO NOTHING
+                """,
+                template="(%(cache_func)s, %(repo_id)s)",
+                argslist=[{"cache_func": func_name, "repo_id": r} for r in repolist],
+            )
+
+    if watermark:
+        # a delta's max is found in the (small) staged rows;
+        # a full load has to look at the target table.
+        _update_watermarks(
+            cache_conn,
+            func_name=func_name,
+            source_table=changed_table,
+            watermark=watermark,
+            repolist=repolist,
+        )
+
+
+def _announce_cached(func_name: str, repolist: list[int]) -> None:
+    """Tells readers about committed pairs."""
+    # frames of these pairs in the hot tier are outdated.
+    invalidate(func_name, repolist)
+    # and requests waiting on them can go ahead.
+    readiness.publish_cached(func_name, repolist)
 
 
 def cache_query_results(
@@ -42,10 +440,24 @@ def cache_query_results(
     bookkeeping_data: tuple[dict],
     server_pagination=2000,
     client_pagination=2000,
+    ingest_mode: str = env_ingest_mode,
+    watermark: str | None = None,
+    replace_key: tuple[str] | None = None,
+    incremental: bool = False,
 ) -> None:
     """Runs {query} against primary database specified by {db_connection_string} with variables {vars}.
     Retrieves results from db with paginations {server_pagination} and {client_pagination}.
 
+    With {ingest_mode} "copy" the rows are streamed with COPY; if that fails
+    the cache transaction is rolled back and the rows are re-read with the
+    paginated INSERT path. Bookkeeping is written in the same transaction as
+    the rows either way.
+
+    With {incremental} the rows are a delta for repos that are already cached;
+    they're staged and merged into {target_table} instead of appended directly.
+
+    Connections are borrowed from the process-wide pools.
+
     Args:
         db_connection_string (str): _description_
         query (str): _description_
@@ -54,67 +466,90 @@ def cache_query_results(
         bookkeeping_data (tuple(dict)): _description_
         server_pagination (int, optional): _description_. Defaults to 2000.
         client_pagination (int, optional): _description_. Defaults to 2000.
+        ingest_mode (str, optional): "copy" or "insert". Defaults to CACHE_INGEST_MODE.
+        watermark (str | None, optional): SQL expression over {target_table} whose max per repo
+            is recorded as the bookkeeping watermark. Defaults to None (no watermark).
+        replace_key (tuple[str] | None, optional): columns identifying a row that may change
+            upstream, used when merging a delta. Defaults to None (append-only).
+        incremental (bool, optional): rows are a delta for cached repos. Defaults to False.
     """
     logging.warning(f"{target_table} -- CQR CACHE_QUERY_RESULTS BEGIN")
-    with pg.connect(
-        db_connection_string,
-        options=f"-c search_path={env_augur_schema}",
-    ) as augur_conn:
-        with augur_conn.cursor(name=f"{target_table}-{uuid4()}") as augur_cur:
-            # set number of rows we want from primary db at a time
-            augur_cur.itersize = server_pagination
-
-            logging.warning(f"{target_table} -- CQR EXECUTING QUERY")
-
-            # execute query with named parameters
-            augur_cur.execute(query, vars)
-
-            logging.warning(f"{target_table} -- CQR STARTING TRANSACTION")
-            # connect to cache
-            with pg.connect(cache_cx_string) as cache_conn:
-                logging.warning(f"{target_table} -- CQR COMPOSING SQL")
-                # compose SQL w/ table name
-                # ref: https://www.psycopg.org/docs/sql.html
-                composed_query = pg_sql.SQL(
-                    "INSERT INTO {tbl_name} VALUES %s ON CONFLICT DO NOTHING".format(tbl_name=target_table)
-                ).as_string(cache_conn)
-
-                # iterate through pages of rows from server.
-                logging.warning(f"{target_table} -- CQR FETCHING AND STORING ROWS")
-                while rows := augur_cur.fetchmany(client_pagination):
-                    if not rows:
-                        # we're out of rows
-                        break
+    func_name = bookkeeping_data[0]["cache_func"]
+    bookkept_repos = [b["repo_id"] for b in bookkeeping_data]
 
-                    # write available rows to cache.
-                    with cache_conn.cursor() as cache_cur:
-                        execute_values(
-                            cur=cache_cur,
-                            sql=composed_query,
-                            argslist=rows,
-                            page_size=client_pagination,
-                        )
+    # pairs that are still cached once locked, see _begin
+    live_repos = bookkept_repos
+
+    def _begin(cache_conn) -> str:
+        nonlocal live_repos
+        # keeps the evictor away from these pairs until commit.
+        with cache_conn.cursor() as cache_cur:
+            _lock_pairs_shared(cache_cur, func_name, bookkept_repos)
+            if incremental:
+                # the refresh was planned before the locks were taken, and the
+                # evictor may have dropped pairs since. Their delta alone isn't
+                # a cache entry, so they're left out; they're collected in full
+                # the next time they're requested.
+                cache_cur.execute(
+                    """
+                    SELECT repo_id FROM cache_bookkeeping
+                    WHERE cache_func = %(cache_func)s AND repo_id = ANY(%(repo_ids)s::int[])
+                    """,
+                    {"cache_func": func_name, "repo_ids": bookkept_repos},
+                )
+                live_repos = [repo_id for (repo_id,) in cache_cur.fetchall()]
+                if len(live_repos) < len(bookkept_repos):
+                    logging.warning(
+                        f"{target_table} -- CQR {len(bookkept_repos) - len(live_repos)} REPOS EVICTED BEFORE REFRESH"
+                    )
+        # deltas go through a staging table so they can be merged,
+        # full loads go straight into the target table.
+        return _create_stage(cache_conn, target_table) if incremental else target_table
+
+    # pooled augur connections already have the augur search_path.
+    augur_connection = (
+        augur_pool.connection()
+        if db_connection_string == db_cx_string
+        else pg.connect(db_connection_string, options=f"-c search_path={env_augur_schema}")
+    )
+    # only a limited number of queries of each type run against augur at once.
+    with admission.admit(func_name), augur_connection as augur_conn:
+        logging.warning(f"{target_table} -- CQR STARTING TRANSACTION")
+        # connect to cache
+        with cache_pool.connection() as cache_conn:
+            load_table = _load_rows(
+                augur_conn,
+                cache_conn,
+                query,
+                vars,
+                _begin,
+                target_table,
+                ingest_mode,
+                server_pagination,
+                client_pagination,
+            )
 
-                # after all data has successfully been written to cache from the primary db,
-                # insert record of existence for each (cache_func, repo_id) pair.
-                logging.warning(f"{target_table} -- CQR UPDATING BOOKKEEPING")
+            if incremental:
                 with cache_conn.cursor() as cache_cur:
-                    execute_values(
-                        cur=cache_cur,
-                        sql="""
-                        INSERT INTO cache_bookkeeping (cache_func, repo_id)
-                        VALUES %s
-                        """,
-                        template="(%(cache_func)s, %(repo_id)s)",
-                        argslist=bookkeeping_data,
+                    cache_cur.execute(
+                        pg_sql.SQL("DELETE FROM {stage} WHERE repo_id <> ALL(%(repo_ids)s::int[])").format(
+                            stage=pg_sql.Identifier(load_table)
+                        ),
+                        {"repo_ids": live_repos},
                     )
+                _merge_stage(cache_conn, load_table, target_table, replace_key)
 
-                logging.warning(f"{target_table} -- CQR COMMITTING TRANSACTION")
-                # TODO: end of context block, on success, should commit. On failure, should rollback. Need to write test for this.
+            _record_pairs(cache_conn, func_name, target_table, load_table, live_repos, watermark, incremental)
+
+            logging.warning(f"{target_table} -- CQR COMMITTING TRANSACTION")
+            # TODO: end of context block, on success, should commit. On failure, should rollback. Need to write test for this.
 
         # don't need to commit on primary db
         logging.warning(f"{target_table} -- CQR SUCCESS")
 
+    if live_repos:
+        _announce_cached(func_name, live_repos)
+
 
 def get_uncached(func_name: str, repolist: list[int]) -> list[int]:  # or None
     """
@@ -123,20 +558,23 @@ def get_uncached(func_name: str, repolist: list[int]) -> list[int]:  # or None
 
     Returns a list of repos that AREN'T resident in cache.
     """
-    with pg.connect(cache_cx_string) as cache_conn:
+    if not repolist:
+        return []
+
+    with cache_pool.connection() as cache_conn:
         with cache_conn.cursor() as cache_cur:
             composed_query = pg_sql.SQL(
                 """
                 SELECT cb.repo_id
                 FROM cache_bookkeeping cb
-                WHERE cb.cache_func = '{cache_func_name}' AND cb.repo_id in %s
+                WHERE cb.cache_func = '{cache_func_name}' AND cb.repo_id = ANY(%s)
                 """.format(
                     cache_func_name=func_name
                 )
             ).as_string(cache_conn)
 
             # exec query
-            cache_cur.execute(query=composed_query, vars=(tuple(repolist),))
+            cache_cur.execute(query=composed_query, vars=(list(repolist),))
 
             # get list of cached repos
             already_cached: list[tuple] = cache_cur.fetchall()
@@ -152,14 +590,354 @@ def get_uncached(func_name: str, repolist: list[int]) -> list[int]:  # or None
             return not_cached
 
 
-def caching_wrapper(func_name: str, query: str, repolist: list[int]) -> None:
+def wait_until_cached(
+    func_name: str, repolist: list[int], timeout: float = env_ready_timeout, on_pending=None
+) -> list[int]:
+    """
+    Blocks until every repo of {repolist} is cached for {func_name}, for
+    at most {timeout} seconds.
+
+    If some repos aren't cached, {on_pending}(func_name, repos) is called
+    once before waiting, e.g. to promote their collection.
+
+    Sleeps on collection events (see readiness.py) rather than polling
+    bookkeeping; bookkeeping is only checked up front and every
+    CACHE_READY_RECHECK seconds in case an event was lost. Repos whose
+    collection failed for good aren't waited on.
+
+    Returns:
+        list[int]: repos that still aren't cached- empty when all are.
+    """
+    deadline = time.monotonic() + timeout
+    subscription = None
+    try:
+        # subscribe before checking, so an event between the check and the wait isn't missed.
+        subscription = readiness.subscribe(func_name)
+    except Exception as e:
+        logging.error(f"{func_name} - COLLECTION EVENTS UNAVAILABLE, RECHECKING BOOKKEEPING: {e}")
+
+    try:
+        pending = set(get_uncached(func_name=func_name, repolist=repolist))
+        if pending and on_pending is not None:
+            on_pending(func_name, sorted(pending))
+        failed = set()
+        next_check = time.monotonic() + env_ready_recheck
+        while pending - failed:
+            now = time.monotonic()
+            if now >= deadline:
+                logging.warning(f"{func_name} - GAVE UP WAITING ON {len(pending)} REPOS")
+                break
+
+            wait = min(deadline, next_check) - now
+            event = None
+            if subscription is not None:
+                try:
+                    event = readiness.parse_event(subscription.get_message(timeout=wait))
+                except Exception as e:
+                    logging.error(f"{func_name} - COLLECTION EVENTS LOST, RECHECKING BOOKKEEPING: {e}")
+                    subscription.close()
+                    subscription = None
+            else:
+                time.sleep(wait)
+
+            if event is not None:
+                repos = set(event["repo_ids"])
+                if event["status"] == "cached":
+                    pending -= repos
+                else:
+                    failed |= pending & repos
+            elif time.monotonic() >= next_check:
+                pending = set(get_uncached(func_name=func_name, repolist=list(pending)))
+                next_check = time.monotonic() + env_ready_recheck
+
+        if failed & pending:
+            logging.warning(f"{func_name} - COLLECTION FAILED FOR {len(failed & pending)} REPOS")
+        return list(pending)
+    finally:
+        if subscription is not None:
+            subscription.close()
+
+
+def get_data_version(func_name: str, repolist: list[int]) -> str | None:
+    """
+    Returns a version of the cached {func_name} data of the repos of
+    {repolist}, derived from their bookkeeping. Collecting, refreshing or
+    evicting any of the pairs changes it.
+
+    Returns None if any of the repos isn't cached.
+    """
+    repos = set(repolist)
+    with cache_pool.connection() as cache_conn:
+        with cache_conn.cursor() as cache_cur:
+            cache_cur.execute(
+                """
+                SELECT count(*), max(cb.ts_cached)
+                FROM cache_bookkeeping cb
+                WHERE cb.cache_func = %(cache_func)s AND cb.repo_id = ANY(%(repo_ids)s)
+                """,
+                {"cache_func": func_name, "repo_ids": list(repos)},
+            )
+            count, last_cached = cache_cur.fetchone()
+
+    if count != len(repos):
+        return None
+    return f"{count}:{last_cached.isoformat() if last_cached else ''}"
+
+
+def get_refreshable(func_name: str, repolist: list[int]) -> dict[int, datetime | None]:
+    """
+    Finds the cached repos of {repolist} that are due for an incremental
+    refresh, i.e. last written more than CACHE_REFRESH_MIN_AGE seconds ago.
+
+    Pairs cached before watermarks were recorded get theirs from the
+    cached rows, so a refresh doesn't re-fetch data that's already there.
+
+    Returns a map of repo_id -> watermark (None if the repo has no rows).
+    """
+    with cache_pool.connection() as cache_conn:
+        with cache_conn.cursor() as cache_cur:
+            cache_cur.execute(
+                pg_sql.SQL(
+                    """
+                    SELECT
+                        cb.repo_id,
+                        COALESCE(
+                            cb.watermark,
+                            (SELECT max({watermark}) FROM {tablename} t WHERE t.repo_id = cb.repo_id)::timestamp
+                        )
+                    FROM cache_bookkeeping cb
+                    WHERE cb.cache_func = %(cache_func)s
+                        AND cb.repo_id = ANY(%(repo_ids)s)
+                        AND cb.ts_cached < CURRENT_TIMESTAMP - make_interval(secs => %(min_age)s)
+                    """
+                ).format(
+                    watermark=pg_sql.SQL(INCREMENTAL_FUNCS[func_name]["watermark"]),
+                    tablename=pg_sql.Identifier(f"{func_name}_query"),
+                ),
+                {"cache_func": func_name, "repo_ids": list(repolist), "min_age": env_refresh_min_age},
+            )
+            return dict(cache_cur.fetchall())
+
+
+def estimate_collection_costs(func_names: list[str], repolist: list[int]) -> dict[str, dict[int, int]]:
+    """
+    Estimates the cost of collecting each repo of {repolist} for each
+    cache function of {func_names}, as an expected row count.
+
+    Repos collected before cost what their last collection did. The
+    others are sized from Augur's repo_info statistics, and repos Augur
+    has no statistics for get the median of the known costs.
+
+    Returns:
+        dict[str, dict[int, int]]: cache function -> repo_id -> cost, at least 1
+    """
+    with cache_pool.connection() as cache_conn:
+        with cache_conn.cursor() as cache_cur:
+            cache_cur.execute(
+                """
+                SELECT cache_func, repo_id, row_count
+                FROM collection_costs
+                WHERE cache_func = ANY(%(cache_funcs)s) AND repo_id = ANY(%(repo_ids)s)
+                """,
+                {"cache_funcs": list(func_names), "repo_ids": list(repolist)},
+            )
+            recorded = cache_cur.fetchall()
+
+    costs = {func_name: {} for func_name in func_names}
+    for func_name, repo_id, row_count in recorded:
+        costs[func_name][repo_id] = row_count
+
+    unknown = sorted({r for func_name in func_names for r in repolist if r not in costs[func_name]})
+    augur_sizes = {}
+    if unknown:
+        try:
+            with augur_pool.connection() as augur_conn:
+                with augur_conn.cursor() as augur_cur:
+                    augur_cur.execute(AUGUR_REPO_SIZE_QUERY, {"repo_ids": unknown})
+                    augur_sizes = {repo_id: sizes for repo_id, *sizes in augur_cur.fetchall()}
+        except Exception as e:
+            logging.error(f"COLLECTION COSTS - AUGUR STATISTICS UNAVAILABLE: {e}")
+
+    for func_name in func_names:
+        known = costs[func_name]
+        fallback = int(pd.Series(list(known.values()), dtype="float64").median()) if known else 1
+        for repo_id in repolist:
+            if repo_id not in known:
+                sizes = augur_sizes.get(repo_id)
+                known[repo_id] = augur_size_estimate(func_name, *sizes) if sizes else fallback
+            known[repo_id] = max(int(known[repo_id]), 1)
+    return costs
+
+
+class CollectionFailed(Exception):
+    """
+    Raised when a collection fails.
+
+    Attributes
+    ----------
+        failed : dict[str, list[int]]
+            cache function -> repos this collector claimed and left uncached.
+            Only these are known to be abandoned; repos claimed by other
+            collectors may still be cached by them.
+    """
+
+    def __init__(self, message, failed: dict[str, list[int]]):
+        super().__init__(message)
+        self.failed = failed
+
+
+def _abandoned(func_name: str, claimed: list[int]) -> list[int]:
+    """The repos of {claimed} that still aren't cached, all of them if that can't be checked."""
+    if not claimed:
+        return []
+    try:
+        return get_uncached(func_name=func_name, repolist=claimed)
+    except Exception:
+        return list(claimed)
+
+
+class _CollectionClaims:
+    """
+    Single-flight claims on (cache_func, repo_id) pairs, shared by all workers.
+
+    A claim is a session-level advisory lock held on a dedicated cache
+    connection for as long as the pair is being collected. Only one task
+    can hold it, and it's released when the connection closes, including
+    when the worker dies mid-collection.
+
+    Deliberately not pooled: session-level locks and settings would
+    outlive the borrow.
+
+    The lock keys live in a different namespace than the shared locks
+    readers, writers and the evictor take on the same pairs.
+    """
+
+    def __init__(self, func_name: str):
+        self.func_name = func_name
+        self._lock_space = f"collect:{func_name}"
+        self._conn = pg.connect(cache_cx_string)
+        self._conn.autocommit = True
+
+    def try_claim(self, repolist: list[int]) -> tuple[list[int], list[int]]:
+        """Claims every repo nobody else is collecting.
+
+        Returns:
+            (list[int], list[int]): claimed repos, repos in flight elsewhere
+        """
+        with self._conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT r.repo_id, pg_try_advisory_lock(hashtext(%(space)s), r.repo_id)
+                FROM unnest(%(repo_ids)s::int[]) AS r(repo_id)
+                ORDER BY r.repo_id
+                """,
+                {"space": self._lock_space, "repo_ids": list(repolist)},
+            )
+            results = cur.fetchall()
+        claimed = [r for r, got in results if got]
+        in_flight = [r for r, got in results if not got]
+        return claimed, in_flight
+
+    def wait_claim(self, repolist: list[int], timeout: float) -> list[int]:
+        """Blocks until the other collectors of {repolist} release their claims,
+        for at most {timeout} seconds overall.
+
+        Returns:
+            list[int]: repos claimed before the deadline
+        """
+        deadline = time.monotonic() + timeout
+        claimed = []
+        with self._conn.cursor() as cur:
+            for repo_id in sorted(repolist):
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    break
+                cur.execute("SELECT set_config('lock_timeout', %s, false)", (f"{remaining_ms}ms",))
+                try:
+                    cur.execute("SELECT pg_advisory_lock(hashtext(%s), %s)", (self._lock_space, repo_id))
+                    claimed.append(repo_id)
+                except pg_errors.LockNotAvailable:
+                    break
+            cur.execute("SELECT set_config('lock_timeout', '0', false)")
+        return claimed
+
+    def close(self) -> None:
+        # closing the session releases every claim it holds.
+        self._conn.close()
+
+
+def _collect_claimed(func_name: str, query: str, claimed: list[int]) -> None:
+    """Fully collects the claimed repos that still aren't cached.
+
+    Another task may have finished them between our bookkeeping check and
+    the claim, so bookkeeping is checked again under the claim.
+    """
+    uncached_repos = get_uncached(func_name=func_name, repolist=claimed)
+    if not uncached_repos:
+        return
+
+    logging.warning(f"{func_name} COLLECTION - EXECUTING CACHING QUERY FOR {len(uncached_repos)} REPOS")
+    cache_query_results(
+        db_connection_string=db_cx_string,
+        query=query,
+        # no lower bound on any repo- full history.
+        vars={"repo_ids": uncached_repos, "since": [None] * len(uncached_repos)},
+        target_table=f"{func_name}_query",
+        # only repos this task collected are recorded; in-flight ones are recorded by their collector.
+        bookkeeping_data=tuple({"cache_func": func_name, "repo_id": r} for r in uncached_repos),
+        watermark=INCREMENTAL_FUNCS.get(func_name, {}).get("watermark"),
+    )
+
+
+def _refresh_claimed(func_name: str, query: str, claimed: list[int]) -> None:
+    """Incrementally refreshes the claimed repos that are still due for it."""
+    incremental_config = INCREMENTAL_FUNCS[func_name]
+    refreshable = get_refreshable(func_name=func_name, repolist=claimed)
+    if not refreshable:
+        logging.warning(f"{func_name} COLLECTION - NO CACHED REPOS DUE FOR REFRESH")
+        return
+
+    logging.warning(f"{func_name} COLLECTION - REFRESHING {len(refreshable)} CACHED REPOS")
+    refresh_repos = list(refreshable.keys())
+    cache_query_results(
+        db_connection_string=db_cx_string,
+        query=query,
+        vars={"repo_ids": refresh_repos, "since": [refreshable[r] for r in refresh_repos]},
+        target_table=f"{func_name}_query",
+        bookkeeping_data=tuple({"cache_func": func_name, "repo_id": r} for r in refresh_repos),
+        watermark=incremental_config["watermark"],
+        replace_key=incremental_config.get("replace_key"),
+        incremental=True,
+    )
+
+
+def caching_wrapper(
+    func_name: str,
+    query: str,
+    repolist: list[int],
+    refresh: bool = False,
+    inflight_policy: str = env_inflight_policy,
+) -> None:
     """Combines steps of (1) identifying which repos aren't already cached and
     (2) querying + caching repos those repos.
 
+    Collection is single-flight across workers: a task only collects the
+    repos it could claim. Repos another task is already collecting are
+    waited on (CACHE_INFLIGHT_POLICY=wait, up to CACHE_INFLIGHT_TIMEOUT
+    seconds) and collected here only if that task failed, or are left to
+    the other task (CACHE_INFLIGHT_POLICY=skip).
+
+    With {refresh}, repos that are already cached and support incremental
+    refresh (see INCREMENTAL_FUNCS) are also brought up to date by fetching
+    only the rows newer than their bookkeeping watermark.
+
     Args:
         func_name (str): literal name of querying function for bookkeeping
         query (str): sql query as a string
         repolist (list[int]): list of repos requested by user.
+        refresh (bool, optional): also refresh cached repos. Defaults to False.
+        inflight_policy (str, optional): "wait" or "skip", for repos in flight elsewhere.
+            Defaults to CACHE_INFLIGHT_POLICY.
 
     Raises:
         Exception: If a step fails, will print exception and re-raise.
@@ -167,35 +945,216 @@ def caching_wrapper(func_name: str, query: str, repolist: list[int]) -> None:
     Returns:
         _type_: None
     """
+    claims = None
+    # repos whose claims this task held
+    owned = []
     try:
         # STEP 1: Which repos need to be queried for?
         #           some might already be in cache.
         uncached_repos: list[int] | None = get_uncached(func_name=func_name, repolist=repolist)
+        uncached_set = set(uncached_repos)
+        cached_repos = list(set(repolist) - uncached_set)
+        refresh = refresh and func_name in INCREMENTAL_FUNCS
         if not uncached_repos:
             logging.warning(f"{func_name} COLLECTION - ALL REQUESTED REPOS IN CACHE")
-            return 0
-        else:
-            logging.warning(f"{func_name} COLLECTION - CACHING {len(uncached_repos)} NEW REPOS")
-
-        # STEP 2: Query for those repos
-        logging.warning(f"{func_name} COLLECTION - EXECUTING CACHING QUERY")
-        cache_query_results(
-            db_connection_string=db_cx_string,
-            query=query,
-            vars={'repo_ids': uncached_repos},
-            target_table=f"{func_name}_query",
-            bookkeeping_data=tuple({"cache_func": func_name, "repo_id": r} for r in repolist),
-        )
+            if not refresh:
+                return 0
+
+        # STEP 2: Claim the repos to work on; others may be collecting some of them.
+        claims = _CollectionClaims(func_name)
+        claimed, in_flight = claims.try_claim(uncached_repos + (cached_repos if refresh else []))
+        owned.extend(claimed)
+        if in_flight:
+            logging.warning(f"{func_name} COLLECTION - {len(in_flight)} REPOS IN FLIGHT ELSEWHERE")
+
+        # STEP 3: Query for the claimed repos
+        claimed_uncached = [r for r in claimed if r in uncached_set]
+        if claimed_uncached:
+            logging.warning(f"{func_name} COLLECTION - CACHING {len(claimed_uncached)} NEW REPOS")
+            _collect_claimed(func_name, query, claimed_uncached)
+
+        # STEP 4: Refresh claimed cached repos from their watermarks.
+        claimed_cached = [r for r in claimed if r not in uncached_set]
+        if refresh and claimed_cached:
+            _refresh_claimed(func_name, query, claimed_cached)
+
+        # STEP 5: Repos collected elsewhere. Once their collector is done, whatever
+        # it didn't manage to cache (e.g. it failed) is collected here.
+        # In-flight refreshes are never waited on- the other task is doing the same work.
+        in_flight_uncached = [r for r in in_flight if r in uncached_set]
+        if in_flight_uncached and inflight_policy == "wait":
+            logging.warning(f"{func_name} COLLECTION - WAITING ON {len(in_flight_uncached)} REPOS IN FLIGHT")
+            late_claimed = claims.wait_claim(in_flight_uncached, timeout=env_inflight_timeout)
+            owned.extend(late_claimed)
+            # empty if the first of them wasn't released in time.
+            if late_claimed:
+                _collect_claimed(func_name, query, late_claimed)
+            if len(late_claimed) < len(in_flight_uncached):
+                logging.warning(f"{func_name} COLLECTION - GAVE UP WAITING ON IN-FLIGHT REPOS")
+
+        return 0
     except Exception as e:
         logging.critical(f"{func_name}_POSTGRES ERROR: {e}")
 
         # raise exception so caching function knows to restart
-        raise Exception(e)
+        raise CollectionFailed(e, {func_name: _abandoned(func_name, owned)})
+    finally:
+        if claims is not None:
+            claims.close()
+
+
+def cache_shared_scan_results(scan_name: str, query: str, outputs: dict[str, list[int]]) -> None:
+    """Runs the shared scan {query} once against the primary database and
+    fans its rows out to the cache table of each cache function of {outputs}.
+
+    The scan covers the union of the repos of {outputs}; each cache table
+    only gets the rows of its own repos. All tables and their bookkeeping
+    are written in one cache transaction, with the same COPY / INSERT
+    fallback as cache_query_results.
+
+    Args:
+        scan_name (str): name of the shared scan in SHARED_SCANS
+        query (str): sql query of the scan as a string
+        outputs (dict[str, list[int]]): cache function -> repos to collect for it
+    """
+    scan = SHARED_SCANS[scan_name]
+    outputs = {func_name: repos for func_name, repos in outputs.items() if repos}
+    scan_repos = sorted(set().union(*outputs.values()))
+    scan_table = f"{scan_name}_scan"
+    logging.warning(f"{scan_table} -- CQR SHARED SCAN BEGIN FOR {len(scan_repos)} REPOS")
+
+    def _begin(cache_conn) -> str:
+        with cache_conn.cursor() as cache_cur:
+            # keeps the evictor away from these pairs until commit.
+            for func_name, repos in outputs.items():
+                _lock_pairs_shared(cache_cur, func_name, repos)
+            cache_cur.execute(
+                pg_sql.SQL("CREATE TEMP TABLE {scan} ({columns}) ON COMMIT DROP").format(
+                    scan=pg_sql.Identifier(scan_table),
+                    # column types are constants of SHARED_SCANS, not user input.
+                    columns=pg_sql.SQL(", ").join(
+                        pg_sql.SQL("{} {}").format(pg_sql.Identifier(c), pg_sql.SQL(t))
+                        for c, t in scan["columns"].items()
+                    ),
+                )
+            )
+        return scan_table
+
+    # no lower bound on any repo- full history.
+    vars = {"repo_ids": scan_repos, "since": [None] * len(scan_repos)}
+
+    with admission.admit(scan_name), augur_pool.connection() as augur_conn:
+        with cache_pool.connection() as cache_conn:
+            _load_rows(augur_conn, cache_conn, query, vars, _begin, scan_table)
+
+            for func_name, repos in outputs.items():
+                target_table = f"{func_name}_query"
+                with cache_conn.cursor() as cache_cur:
+                    cache_cur.execute(
+                        pg_sql.SQL("INSERT INTO {target} ").format(target=pg_sql.Identifier(target_table))
+                        + pg_sql.SQL(scan["outputs"][func_name]).format(scan=pg_sql.Identifier(scan_table)),
+                        {"repo_ids": repos},
+                    )
+                    logging.warning(f"{target_table} -- CQR FANNED OUT {cache_cur.rowcount} ROWS")
+
+                # a full load, so everything is rebuilt from the target table.
+                _record_pairs(
+                    cache_conn,
+                    func_name,
+                    target_table,
+                    target_table,
+                    repos,
+                    INCREMENTAL_FUNCS.get(func_name, {}).get("watermark"),
+                )
+
+            logging.warning(f"{scan_table} -- CQR COMMITTING TRANSACTION")
+
+    logging.warning(f"{scan_table} -- CQR SUCCESS")
+    for func_name, repos in outputs.items():
+        _announce_cached(func_name, repos)
+
+
+def shared_scan_wrapper(scan_name: str, query: str, repolist: list[int]) -> None:
+    """Collects the repos of {repolist} that aren't cached for one or more
+    cache functions of the shared scan {scan_name}, with a single scan.
+
+    Only repos that could be claimed for a function are collected for it;
+    repos in flight elsewhere, refreshes and anything that failed are left
+    to caching_wrapper, which callers run for each function afterwards.
+
+    Args:
+        scan_name (str): name of the shared scan in SHARED_SCANS
+        query (str): sql query of the scan as a string
+        repolist (list[int]): list of repos requested by user.
+    """
+    claims = []
+    outputs = {}
+    try:
+        for func_name in SHARED_SCANS[scan_name]["outputs"]:
+            uncached_repos = get_uncached(func_name=func_name, repolist=repolist)
+            if not uncached_repos:
+                continue
+            func_claims = _CollectionClaims(func_name)
+            claims.append(func_claims)
+            claimed, _ = func_claims.try_claim(uncached_repos)
+            # all of them in flight elsewhere, left to caching_wrapper.
+            if not claimed:
+                continue
+            # another task may have finished them before the claim.
+            outputs[func_name] = get_uncached(func_name=func_name, repolist=claimed)
+
+        if not any(outputs.values()):
+            logging.warning(f"{scan_name} SHARED SCAN - NOTHING TO COLLECT")
+            return
+        cache_shared_scan_results(scan_name, query, outputs)
+    except Exception as e:
+        logging.critical(f"{scan_name}_SHARED_SCAN ERROR: {e}")
+        raise CollectionFailed(
+            e, {func_name: _abandoned(func_name, repos) for func_name, repos in outputs.items()}
+        )
+    finally:
+        for func_claims in claims:
+            func_claims.close()
+
+
+def _coerce_timestamp_columns(df: pd.DataFrame, description) -> None:
+    """
+    Makes sure timestamp columns come back as datetime64[ns, UTC].
+
+    pandas usually infers this from the datetimes psycopg2 returns, but
+    an all-NULL or mixed column stays 'object', which readers would then
+    have to re-parse.
+    """
+    for desc in description:
+        if desc.type_code in _TIMESTAMP_OIDS and df[desc.name].dtype == object:
+            df[desc.name] = pd.to_datetime(df[desc.name], utc=True)
+
+
+def _touch_pairs(cache_cur, func_name: str, repolist: list[int]) -> None:
+    """Records a read of each (func_name, repo_id) pair for LRU eviction.
+    Pairs read within the last minute aren't rewritten, so popular repos
+    don't turn every read into a bookkeeping write.
+    """
+    cache_cur.execute(
+        """
+        UPDATE cache_bookkeeping
+        SET ts_accessed = CURRENT_TIMESTAMP
+        WHERE cache_func = %(cache_func)s
+            AND repo_id = ANY(%(repo_ids)s)
+            AND (ts_accessed IS NULL OR ts_accessed < CURRENT_TIMESTAMP - interval '1 minute')
+        """,
+        {"cache_func": func_name, "repo_ids": list(repolist)},
+    )
 
 
 def retrieve_from_cache(
     tablename: str,
     repolist: list[int],
+    columns: list[str] | None = None,
+    time_column: str | None = None,
+    start=None,
+    end=None,
+    filters: dict | None = None,
 ) -> pd.DataFrame:
     """
     For a given table in cache, get all results
@@ -203,22 +1162,63 @@ def retrieve_from_cache(
 
     Results are retrieved by a DataFrame, so column names
     may need to be overridden by calling function.
+
+    Only {columns} are read, and only rows with {time_column} in
+    [{start}, {end}) and matching {filters}; all of it is applied in SQL.
+    See cache_select.build_cache_select for the arguments.
+
+    Frames of recently read repos are served from the redis hot tier
+    (see hot_tier.py); postgres is only read for the rest.
+
+    When the ADBC driver is installed (and CACHE_RETRIEVAL_MODE is
+    "arrow"), the data is read columnar and converted to pandas with
+    minimal copying. Callers that want the Arrow table itself can use
+    arrow_cache.retrieve_arrow.
     """
+    if not hot_tier_enabled():
+        return _retrieve_from_postgres(tablename, repolist, columns, time_column, start, end, filters)
+
+    # frames are stored per repo, so the repo_id has to be read to split them.
+    read_columns = columns if not columns or "repo_id" in columns else ["repo_id", *columns]
+    df = read_through(
+        tablename.removesuffix("_query"),
+        repolist,
+        selection_tag(read_columns, time_column, start, end, filters),
+        lambda repos: _retrieve_from_postgres(tablename, repos, read_columns, time_column, start, end, filters),
+    )
+    return df[columns] if read_columns is not columns else df
+
+
+def _retrieve_from_postgres(
+    tablename: str,
+    repolist: list[int],
+    columns: list[str] | None = None,
+    time_column: str | None = None,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """Reads the postgres cache for retrieve_from_cache."""
+    if env_retrieval_mode == "arrow" and arrow_available():
+        try:
+            return arrow_to_pandas(
+                retrieve_arrow(tablename, repolist, columns, time_column, start, end, filters)
+            )
+        except Exception as e:
+            logging.error(f"{tablename} - ARROW RETRIEVAL FAILED, FALLING BACK TO ROWS: {e}")
+
+    func_name = tablename.removesuffix("_query")
 
     # GET ALL DATA FROM POSTGRES CACHE
     df = None
-    with pg.connect(cache_cx_string) as cache_conn:
+    with cache_pool.connection() as cache_conn:
         with cache_conn.cursor() as cache_cur:
-            cache_cur.execute(
-                """
-                SELECT *
-                FROM {tablename} t
-                WHERE t.repo_id IN %s;
-                """.format(
-                    tablename=tablename
-                ),
-                (tuple(repolist),),
-            )
+            # the evictor can't drop these pairs while they're being read.
+            _lock_pairs_shared(cache_cur, func_name, repolist)
+            _touch_pairs(cache_cur, func_name, repolist)
+
+            # rendered with literals- there are no parameters to bind.
+            cache_cur.execute(build_cache_select(tablename, repolist, columns, time_column, start, end, filters))
 
             logging.warning(f"{tablename} - LOADING DATA FROM CACHE")
             df = pd.DataFrame(
@@ -226,5 +1226,259 @@ def retrieve_from_cache(
                 # get df column names from the database columns
                 columns=[desc[0] for desc in cache_cur.description],
             )
+            _coerce_timestamp_columns(df, cache_cur.description)
             logging.warning(f"{tablename} - DATA LOADED - {df.shape} rows,cols")
             return df
+
+
+def retrieve_time_buckets(
+    tablename: str,
+    repolist: list[int],
+    time_column: str,
+    interval,
+    count_column: str | None = None,
+    distinct: bool = True,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """
+    For a given table in cache, count the rows of the repos of {repolist}
+    per time-bin of {time_column}, in the database.
+
+    Only one row per bin is returned, instead of every row of the table.
+    See cache_select.build_cache_bucket_count for the arguments.
+
+    Results of recently read selections are served from the redis hot
+    tier (see hot_tier.py).
+
+    Returns:
+        pd.DataFrame: columns 'bucket' (tz-naive UTC bin start) and 'count',
+            ordered by bucket.
+    """
+    if hot_tier_enabled():
+        return read_through_selection(
+            tablename.removesuffix("_query"),
+            repolist,
+            selection_tag(["buckets", count_column, distinct], time_column, start, end, [interval, filters]),
+            lambda: _time_buckets_from_postgres(
+                tablename, repolist, time_column, interval, count_column, distinct, start, end, filters
+            ),
+        )
+    return _time_buckets_from_postgres(
+        tablename, repolist, time_column, interval, count_column, distinct, start, end, filters
+    )
+
+
+def _time_buckets_from_postgres(
+    tablename: str,
+    repolist: list[int],
+    time_column: str,
+    interval,
+    count_column: str | None = None,
+    distinct: bool = True,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """Reads the postgres cache for retrieve_time_buckets."""
+    func_name = tablename.removesuffix("_query")
+
+    with cache_pool.connection() as cache_conn:
+        with cache_conn.cursor() as cache_cur:
+            # the evictor can't drop these pairs while they're being read.
+            _lock_pairs_shared(cache_cur, func_name, repolist)
+            _touch_pairs(cache_cur, func_name, repolist)
+
+            cache_cur.execute(
+                build_cache_bucket_count(
+                    tablename, repolist, time_column, interval, count_column, distinct, start, end, filters
+                )
+            )
+            logging.warning(f"{tablename} - LOADING BUCKETS FROM CACHE")
+            df = pd.DataFrame(cache_cur.fetchall(), columns=["bucket", "count"])
+
+    df["bucket"] = pd.to_datetime(df["bucket"], utc=True).dt.tz_localize(None)
+    logging.warning(f"{tablename} - BUCKETS LOADED - {len(df)} buckets")
+    return df
+
+
+def retrieve_rollup_buckets(
+    tablename: str,
+    repolist: list[int],
+    interval,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """
+    For a given table in cache, sum its daily rollup for the repos of
+    {repolist} per time-bin of {interval}.
+
+    Reads a few rows per repo and day instead of every cached row, see
+    rollups.py for what each rollup counts. Arguments are as in
+    retrieve_time_buckets; {filters} apply to the rollup's columns.
+
+    Returns:
+        pd.DataFrame: column 'bucket' (tz-naive UTC bin start), then one
+            column per rollup count, ordered by bucket.
+    """
+    if hot_tier_enabled():
+        return read_through_selection(
+            DAILY_ROLLUPS[tablename]["cache_func"],
+            repolist,
+            selection_tag(["rollup", tablename], None, start, end, [interval, filters]),
+            lambda: _rollup_buckets_from_postgres(tablename, repolist, interval, start, end, filters),
+        )
+    return _rollup_buckets_from_postgres(tablename, repolist, interval, start, end, filters)
+
+
+def _rollup_buckets_from_postgres(
+    tablename: str,
+    repolist: list[int],
+    interval,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
+    """Reads the daily rollup for retrieve_rollup_buckets."""
+    rollup = DAILY_ROLLUPS[tablename]
+
+    with cache_pool.connection() as cache_conn:
+        with cache_conn.cursor() as cache_cur:
+            # rollup rows are evicted with their pair, same locks as the cache table.
+            _lock_pairs_shared(cache_cur, rollup["cache_func"], repolist)
+            _touch_pairs(cache_cur, rollup["cache_func"], repolist)
+
+            cache_cur.execute(
+                build_rollup_bucket_sum(rollup["table"], repolist, interval, list(rollup["columns"]), start, end, filters)
+            )
+            logging.warning(f"{rollup['table']} - LOADING BUCKETS FROM ROLLUP")
+            df = pd.DataFrame(cache_cur.fetchall(), columns=["bucket", *rollup["columns"]])
+
+    df["bucket"] = pd.to_datetime(df["bucket"], utc=True).dt.tz_localize(None)
+    logging.warning(f"{rollup['table']} - BUCKETS LOADED - {len(df)} buckets")
+    return df
+
+
+def _estimate_cache_size(cache_cur) -> dict[str, tuple[int, int]]:
+    """
+    Estimates the live size of each cache table from planner statistics.
+
+    Relation sizes on disk don't shrink after rows are deleted, so they
+    can't tell whether eviction freed enough. Live tuples times the
+    average row width can.
+
+    Returns a map of table -> (estimated live bytes, estimated bytes per row).
+    """
+    cache_cur.execute(
+        """
+        SELECT
+            st.relname,
+            st.n_live_tup,
+            -- 28 bytes of tuple header and line pointer per row
+            COALESCE(
+                (SELECT sum(ps.avg_width) FROM pg_stats ps
+                 WHERE ps.schemaname = st.schemaname AND ps.tablename = st.relname),
+                0
+            ) + 28 AS row_bytes
+        FROM pg_stat_user_tables st
+        WHERE st.relname LIKE '%\\_query'
+        """
+    )
+    return {table: (int(n_live * row_bytes), int(row_bytes)) for table, n_live, row_bytes in cache_cur.fetchall()}
+
+
+def evict_lru(budget_bytes: int = env_size_budget_bytes, batch_size: int = 100) -> int:
+    """
+    Drops the least-recently-used (cache_func, repo_id) pairs until the
+    estimated size of the cache is within {budget_bytes}.
+
+    Each pair's rows, its daily rollup and its bookkeeping are deleted
+    together in one transaction. Pairs that are being read or written hold a shared
+    advisory lock and are skipped.
+
+    Args:
+        budget_bytes (int, optional): size budget. Defaults to CACHE_SIZE_BUDGET_MB, 0 disables eviction.
+        batch_size (int, optional): LRU candidates considered per pass. Defaults to 100.
+
+    Returns:
+        int: number of pairs evicted.
+    """
+    if budget_bytes <= 0:
+        return 0
+
+    evicted = 0
+    evicted_tables = set()
+    with cache_pool.connection() as cache_conn:
+        with cache_conn.cursor() as cache_cur:
+            table_sizes = _estimate_cache_size(cache_cur)
+            total = sum(size for size, _ in table_sizes.values())
+            logging.warning(f"CACHE EVICTION - ESTIMATED SIZE {total} / BUDGET {budget_bytes} BYTES")
+            cache_conn.commit()
+
+            skipped = 0
+            while total > budget_bytes:
+                cache_cur.execute(
+                    """
+                    SELECT cb.cache_func, cb.repo_id
+                    FROM cache_bookkeeping cb
+                    ORDER BY COALESCE(cb.ts_accessed, cb.ts_cached)
+                    OFFSET %s LIMIT %s
+                    """,
+                    (skipped, batch_size),
+                )
+                candidates = cache_cur.fetchall()
+                cache_conn.commit()
+                if not candidates:
+                    break
+
+                for func_name, repo_id in candidates:
+                    if total <= budget_bytes:
+                        break
+
+                    target_table = f"{func_name}_query"
+                    cache_cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s), %s)", (func_name, repo_id))
+                    if not cache_cur.fetchone()[0]:
+                        # in use- leave it for the next run.
+                        cache_conn.rollback()
+                        skipped += 1
+                        continue
+
+                    deleted = 0
+                    if target_table in table_sizes:
+                        cache_cur.execute(
+                            pg_sql.SQL("DELETE FROM {tbl} WHERE repo_id = %s").format(tbl=pg_sql.Identifier(target_table)),
+                            (repo_id,),
+                        )
+                        deleted = cache_cur.rowcount
+                    if func_name in ROLLUP_TABLES:
+                        cache_cur.execute(
+                            pg_sql.SQL("DELETE FROM {tbl} WHERE repo_id = %s").format(
+                                tbl=pg_sql.Identifier(ROLLUP_TABLES[func_name])
+                            ),
+                            (repo_id,),
+                        )
+                    cache_cur.execute(
+                        "DELETE FROM cache_bookkeeping WHERE cache_func = %s AND repo_id = %s",
+                        (func_name, repo_id),
+                    )
+                    # releases the lock.
+                    cache_conn.commit()
+                    invalidate(func_name, [repo_id])
+
+                    evicted += 1
+                    evicted_tables.add(target_table)
+                    total -= deleted * table_sizes.get(target_table, (0, 0))[1]
+
+    if evicted_tables & set(table_sizes):
+        # make the space of deleted rows reusable. VACUUM can't run in a transaction.
+        vacuum_conn = pg.connect(cache_cx_string)
+        vacuum_conn.autocommit = True
+        with vacuum_conn.cursor() as vacuum_cur:
+            for table in evicted_tables & set(table_sizes):
+                vacuum_cur.execute(pg_sql.SQL("VACUUM {tbl}").format(tbl=pg_sql.Identifier(table)))
+        vacuum_conn.close()
+
+    logging.warning(f"CACHE EVICTION - EVICTED {evicted} PAIRS")
+    return evicted
@@ -19,7 +19,7 @@ class CacheManager:
             Creates a unique hash for each job based on the job's calling
             function and the list of repos that the function is being run with.
 
-        set(func, repo, data) :
+        set(func, repo, data, ttl) :
             Sets data at key hash(func, repo).
 
         setm(func, [repo], [data]) :
@@ -38,6 +38,24 @@ class CacheManager:
         existsm(func, [repo]):
             Returns number of names that exist.
 
+        generationsm(func, [repo]):
+            Returns the current generation of each (func, repo) pair.
+
+        invalidatem(func, [repo]):
+            Bumps the generation of each pair, orphaning its frames.
+
+        getm_frames(func, [repo], [generation], tag):
+            Returns {repo: DataFrame} for the frames stored at these generations.
+
+        setm_frames(func, [repo], [generation], [DataFrame], tag, ttl, max_bytes):
+            Stores feather-serialized frames with a TTL.
+
+        get_selection_frame(func, [repo], [generation], tag):
+            Returns the frame stored for a whole repo selection, None if Nil.
+
+        set_selection_frame(func, [repo], [generation], DataFrame, tag, ttl, max_bytes):
+            Stores a feather-serialized frame of a whole repo selection with a TTL.
+
     """
 
     def __init__(self, decode_value=False):
@@ -75,8 +93,8 @@ class CacheManager:
         # practicing good securiy protocol.
         hashfunc = hashlib.md5()
 
-        # use the called function's name
-        hashfunc.update(bytes(func.__name__, "utf-8"))
+        # use the called function's name (or the cache function name itself)
+        hashfunc.update(bytes(func if isinstance(func, str) else func.__name__, "utf-8"))
 
         # and the repo list we're passing to it
         hashfunc.update(bytes(str(repo), "utf-8"))
@@ -85,20 +103,21 @@ class CacheManager:
 
         return h
 
-    def set(self, func, repo, data):
+    def set(self, func, repo, data, ttl=None):
         """Sets redis value as data at name=hash(func, repo)
 
         Args:
             func (function): Query function used
             repo (int): repo_id of repo
             data (list(dict)): rows of data in dictionary format.
+            ttl (int | None): seconds until the value expires, None for never.
 
         Returns:
             boolean: confirmation of successful set operation.
         """
 
         # set redis value at 'name=hash' to 'data'
-        ack = self._redis.set(name=self._get_hash(func=func, repo=repo), value=data)
+        ack = self._redis.set(name=self._get_hash(func=func, repo=repo), value=data, ex=ttl)
 
         return ack
 
@@ -227,3 +246,135 @@ class CacheManager:
         out_df = pd.concat(pd_dfs)
 
         return out_df
+
+    def generationsm(self, func, repos):
+        """Gets the generation of each (func, repo) pair.
+
+        A pair's frames are stored under its generation; bumping it with
+        'invalidatem' orphans them without having to find and delete them.
+        Generation keys have no TTL, so a 'volatile-*' maxmemory policy
+        never evicts them.
+
+        Args:
+            func (function | str): Query function used
+            repo (list[int]): list of repo_ids of repos
+
+        Returns:
+            list[int]: generations, 0 for pairs never invalidated.
+        """
+        gs = self._redis.mget([f"gen:{self._get_hash(func, r)}" for r in repos])
+        return [int(g) if g is not None else 0 for g in gs]
+
+    def invalidatem(self, func, repos):
+        """Bumps the generation of each (func, repo) pair in one round trip.
+
+        Args:
+            func (function | str): Query function used
+            repo (list[int]): list of repo_ids of repos
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        for r in repos:
+            pipe.incr(f"gen:{self._get_hash(func, r)}")
+        pipe.execute()
+
+    def _frame_key(self, func, repo, generation, tag):
+        return f"df:{self._get_hash(func, repo)}:{generation}:{tag}"
+
+    def getm_frames(self, func, repos, generations, tag):
+        """Gets the frames of (func, repo) pairs at the given generations.
+
+        Args:
+            func (function | str): Query function used
+            repo (list[int]): list of repo_ids of repos
+            generations (list[int]): generation of each repo, from 'generationsm'
+            tag (str): identifies what was read for the pair, e.g. a column selection
+
+        Returns:
+            dict[int, pd.DataFrame]: frames of the repos that were stored.
+        """
+        blobs = self._redis.mget([self._frame_key(func, r, g, tag) for r, g in zip(repos, generations)])
+        return {r: pd.read_feather(io.BytesIO(b)) for r, b in zip(repos, blobs) if b is not None}
+
+    def setm_frames(self, func, repos, generations, frames, tag, ttl, max_bytes=None):
+        """Stores feather-serialized frames of (func, repo) pairs with a TTL.
+
+        Frames are stored under the generation they were read at, so a
+        frame read before an invalidation is never served after it.
+
+        Args:
+            func (function | str): Query function used
+            repo (list[int]): list of repo_ids of repos
+            generations (list[int]): generation of each repo, read before its frame was read
+            frames (list[pd.DataFrame]): frame of each repo
+            tag (str): identifies what was read for the pair
+            ttl (int): seconds until the frames expire
+            max_bytes (int | None): frames larger than this aren't stored
+
+        Returns:
+            int: number of frames stored.
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        stored = 0
+        for r, g, df in zip(repos, generations, frames):
+            buff = io.BytesIO()
+            df.reset_index(drop=True).to_feather(buff)
+            if max_bytes is not None and buff.tell() > max_bytes:
+                continue
+            pipe.set(self._frame_key(func, r, g, tag), buff.getvalue(), ex=ttl)
+            stored += 1
+        pipe.execute()
+        return stored
+
+    def _selection_key(self, func, repos, generations, tag):
+        # any pair's generation bump changes the key, orphaning the frame.
+        pairs = sorted(zip(repos, generations))
+        return f"dfsel:{self._get_hash(func, pairs)}:{tag}"
+
+    def get_selection_frame(self, func, repos, generations, tag):
+        """Gets the frame of a whole repo selection at the given generations.
+
+        Args:
+            func (function | str): Query function used
+            repo (list[int]): list of repo_ids of the selection
+            generations (list[int]): generation of each repo, from 'generationsm'
+            tag (str): identifies what was read for the selection
+
+        Returns:
+            pd.DataFrame | None: the stored frame, None if there's none.
+        """
+        blob = self._redis.get(self._selection_key(func, repos, generations, tag))
+        return pd.read_feather(io.BytesIO(blob)) if blob is not None else None
+
+    def set_selection_frame(self, func, repos, generations, frame, tag, ttl, max_bytes=None):
+        """Stores the feather-serialized frame of a whole repo selection with a TTL.
+
+        Args:
+            func (function | str): Query function used
+            repo (list[int]): list of repo_ids of the selection
+            generations (list[int]): generation of each repo, read before the frame was read
+            frame (pd.DataFrame): frame of the selection
+            tag (str): identifies what was read for the selection
+            ttl (int): seconds until the frame expires
+            max_bytes (int | None): frames larger than this aren't stored
+
+        Returns:
+            boolean: whether the frame was stored.
+        """
+        buff = io.BytesIO()
+        frame.reset_index(drop=True).to_feather(buff)
+        if max_bytes is not None and buff.tell() > max_bytes:
+            return False
+        return bool(self._redis.set(self._selection_key(func, repos, generations, tag), buff.getvalue(), ex=ttl))
+
+
+_shared_manager = None
+
+
+def get_cache_manager():
+    """Returns this process' shared CacheManager, creating it on first use.
+    redis-py connects lazily and re-creates its connections after fork.
+    """
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = CacheManager()
+    return _shared_manager
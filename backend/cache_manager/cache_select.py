@@ -0,0 +1,211 @@
+"""
+Builds the SELECT statements used to read cached data.
+
+The cache is read through three drivers (psycopg2, ADBC and asyncpg),
+each with its own parameter placeholders and its own rules for binding
+lists and timestamps. Reads only ever filter on ints, strings and
+timestamps supplied by application code, so rather than translating
+parameters per driver the statement is rendered with literals once and
+every driver runs the same SQL text.
+
+Identifiers are checked against a strict pattern and literals are
+escaped for standard_conforming_strings (the postgres default), so no
+value can change the shape of the statement.
+"""
+import datetime as dt
+import numbers
+import re
+
+import pandas as pd
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def _identifier(name: str) -> str:
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"invalid cache identifier: {name!r}")
+    return name
+
+
+def _literal(value) -> str:
+    """Renders a python value as a postgres literal."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    if isinstance(value, (dt.datetime, dt.date, pd.Timestamp)):
+        return f"'{pd.Timestamp(value).isoformat()}'::timestamptz"
+    if isinstance(value, str):
+        if "\x00" in value:
+            raise ValueError("cache filter values can't contain NUL")
+        return "'" + value.replace("'", "''") + "'"
+    raise TypeError(f"unsupported cache filter value: {value!r}")
+
+
+def _in_list(column: str, values) -> str:
+    values = list(values)
+    if not values:
+        # nothing can match an empty list.
+        return "FALSE"
+    return f"t.{column} IN ({', '.join(_literal(v) for v in values)})"
+
+
+def _where(
+    repolist: list[int],
+    time_column: str | None = None,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> str:
+    conditions = [_in_list("repo_id", (int(r) for r in repolist))]
+
+    if (start is not None or end is not None) and time_column is None:
+        raise ValueError("start/end need a time_column")
+    if start is not None:
+        conditions.append(f"t.{_identifier(time_column)} >= {_literal(pd.Timestamp(start))}")
+    if end is not None:
+        conditions.append(f"t.{_identifier(time_column)} < {_literal(pd.Timestamp(end))}")
+
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(_in_list(_identifier(column), value))
+        elif value is None:
+            conditions.append(f"t.{_identifier(column)} IS NULL")
+        else:
+            conditions.append(f"t.{_identifier(column)} = {_literal(value)}")
+
+    return " AND ".join(conditions)
+
+
+def build_cache_select(
+    tablename: str,
+    repolist: list[int],
+    columns: list[str] | None = None,
+    time_column: str | None = None,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> str:
+    """
+    Renders the SELECT for reading {tablename} for the repos of {repolist}.
+
+    Args:
+        tablename (str): cache table to read
+        repolist (list[int]): repos to read
+        columns (list[str] | None, optional): columns to return, in order. Defaults to all columns.
+        time_column (str | None, optional): timestamp column {start} and {end} apply to.
+        start (datetime | str | None, optional): inclusive lower bound on {time_column}.
+        end (datetime | str | None, optional): exclusive upper bound on {time_column}.
+        filters (dict | None, optional): column -> value for equality, or
+            column -> list of values for membership.
+
+    Returns:
+        str: the statement
+    """
+    select_list = "*" if not columns else ", ".join(f"t.{_identifier(c)}" for c in columns)
+
+    return "SELECT {select_list} FROM {tablename} t WHERE {conditions}".format(
+        select_list=select_list,
+        tablename=_identifier(tablename),
+        conditions=_where(repolist, time_column, start, end, filters),
+    )
+
+
+def bucket_expression(column: str, interval) -> str:
+    """
+    Renders the SQL expression that truncates {column} to the start of
+    its time-bin, for the intervals get_graph_time_values supports.
+
+    Bins start on the same boundaries pandas' to_period uses for
+    D, W (weeks start on Monday) and M. M3 and M6 bins are calendar
+    quarters and halves, anything else is a calendar year.
+    """
+    column = f"t.{_identifier(column)}"
+    if interval == 86400000 or interval == "D":
+        return f"date_trunc('day', {column})"
+    elif interval == 604800000 or interval == "W":
+        return f"date_trunc('week', {column})"
+    elif interval == "M" or interval == "M1":
+        return f"date_trunc('month', {column})"
+    elif interval == "M3":
+        return f"date_trunc('quarter', {column})"
+    elif interval == "M6":
+        return (
+            f"date_trunc('year', {column})"
+            f" + CASE WHEN extract(month FROM {column}) > 6 THEN interval '6 months' ELSE interval '0' END"
+        )
+    return f"date_trunc('year', {column})"
+
+
+def build_cache_bucket_count(
+    tablename: str,
+    repolist: list[int],
+    time_column: str,
+    interval,
+    count_column: str | None = None,
+    distinct: bool = True,
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> str:
+    """
+    Renders the SELECT that counts the rows of {tablename} per time-bin of
+    {time_column}, so only one row per bin leaves the database.
+
+    Args:
+        tablename (str): cache table to read
+        repolist (list[int]): repos to read
+        time_column (str): timestamp column to bin
+        interval (str | int): bin size, as accepted by get_graph_time_values
+        count_column (str | None, optional): column whose values are counted. Defaults to counting rows.
+        distinct (bool, optional): count distinct values of {count_column}. Defaults to True.
+        start, end, filters: as in build_cache_select
+
+    Returns:
+        str: the statement, with columns (bucket, count)
+    """
+    if count_column is None:
+        count = "count(*)"
+    else:
+        count = f"count({'DISTINCT ' if distinct else ''}t.{_identifier(count_column)})"
+
+    return (
+        "SELECT {bucket} AS bucket, {count} AS count FROM {tablename} t "
+        "WHERE {conditions} AND t.{time_column} IS NOT NULL GROUP BY 1 ORDER BY 1"
+    ).format(
+        bucket=bucket_expression(time_column, interval),
+        count=count,
+        tablename=_identifier(tablename),
+        conditions=_where(repolist, time_column, start, end, filters),
+        time_column=_identifier(time_column),
+    )
+
+
+def build_rollup_bucket_sum(
+    rollup_table: str,
+    repolist: list[int],
+    interval,
+    value_columns: list[str],
+    start=None,
+    end=None,
+    filters: dict | None = None,
+) -> str:
+    """
+    Renders the SELECT that sums {value_columns} of a daily rollup table
+    per time-bin of {interval}.
+
+    Returns:
+        str: the statement, with columns (bucket, *value_columns)
+    """
+    sums = ", ".join(f"sum(t.{_identifier(c)})::bigint AS {c}" for c in value_columns)
+
+    return "SELECT {bucket} AS bucket, {sums} FROM {tablename} t WHERE {conditions} GROUP BY 1 ORDER BY 1".format(
+        bucket=bucket_expression("day", interval),
+        sums=sums,
+        tablename=_identifier(rollup_table),
+        conditions=_where(repolist, "day", start, end, filters),
+    )
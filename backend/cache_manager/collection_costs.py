@@ -0,0 +1,92 @@
+"""
+Per-repo cost estimates for collection.
+
+Repos differ by orders of magnitude in how many rows a query returns
+for them, so shards with the same number of repos can take wildly
+different times to collect. The estimates here let dispatch pack repos
+into shards of roughly equal expected cost instead.
+
+The cost of a (cache_func, repo_id) pair is the number of rows its last
+collection left in the cache table. Estimates outlive eviction, so a
+repo that was evicted and requested again is still sized correctly.
+Repos that were never collected are sized from Augur's repo_info
+statistics, see AUGUR_REPO_SIZE_QUERY.
+
+Used by both cache_facade (relative import) and db_init (run as a
+script from this directory), so this module has no package imports.
+"""
+import logging
+
+# latest repo_info statistics of each repo; columns are commits, PRs, issues.
+AUGUR_REPO_SIZE_QUERY = """
+    SELECT DISTINCT ON (ri.repo_id)
+        ri.repo_id,
+        COALESCE(ri.commit_count, 0),
+        COALESCE(ri.pull_request_count, 0),
+        COALESCE(ri.issues_count, 0)
+    FROM repo_info ri
+    WHERE ri.repo_id = ANY(%(repo_ids)s)
+    ORDER BY ri.repo_id, ri.data_collection_date DESC
+"""
+
+
+def augur_size_estimate(func_name: str, commits: int, prs: int, issues: int) -> int:
+    """
+    Expected rows of {func_name} for a repo with the given repo_info statistics.
+
+    Queries over PRs or issues scale with those, everything else is
+    sized by the repo's overall activity.
+    """
+    if func_name.startswith("pr"):
+        return prs
+    if func_name.startswith("issue"):
+        return issues
+    if func_name == "commits":
+        return commits
+    return commits + prs + issues
+
+
+def create_collection_costs_table(cur) -> None:
+    """
+    Creates the table of per-repo collection costs if it doesn't exist yet.
+    """
+    cur.execute(
+        """
+        CREATE UNLOGGED TABLE IF NOT EXISTS collection_costs(
+            cache_func text,
+            repo_id int,
+            row_count bigint NOT NULL,
+            ts_updated timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (cache_func, repo_id)
+        )
+        """
+    )
+    logging.warning("CREATED collection_costs TABLE")
+
+
+def record_collection_costs(cur, func_name: str, target_table: str, repolist: list[int]) -> None:
+    """
+    Records the rows {target_table} holds for each repo of {repolist} as
+    the cost of collecting it for {func_name}.
+
+    Must run in the transaction that wrote {target_table}, after the writes.
+
+    Args:
+        cur: cursor of the ingest transaction
+        func_name (str): cache function the rows belong to
+        target_table (str): cache table that changed
+        repolist (list[int]): repos whose rows changed
+    """
+    # table name is derived from a cache function, not user input.
+    cur.execute(
+        f"""
+        INSERT INTO collection_costs (cache_func, repo_id, row_count)
+        SELECT %(cache_func)s, r.repo_id, count(t.repo_id)
+        FROM unnest(%(repo_ids)s::int[]) AS r(repo_id)
+        LEFT JOIN {target_table} t ON t.repo_id = r.repo_id
+        GROUP BY r.repo_id
+        ON CONFLICT (cache_func, repo_id)
+        DO UPDATE SET row_count = EXCLUDED.row_count, ts_updated = CURRENT_TIMESTAMP
+        """,
+        {"cache_func": func_name, "repo_ids": list(repolist)},
+    )
@@ -4,6 +4,7 @@ Connection Common file - accessing environment variables
 import os
 import logging
 import time
+from urllib.parse import quote
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -31,6 +32,42 @@ env_schema = os.getenv("CACHE_SCHEMA", "augur_data")
 
 logging.critical(env_password)
 
+# how rows move from augur to the cache.
+# "copy" streams through COPY TO STDOUT / COPY FROM STDIN,
+# "insert" uses paginated INSERT statements.
+env_ingest_mode = os.getenv("CACHE_INGEST_MODE", "copy")
+# COPY wire format, "csv" or "binary". binary requires that cache
+# column types exactly match the types augur returns.
+env_copy_format = os.getenv("CACHE_COPY_FORMAT", "csv")
+# max number of COPY chunks held in memory between augur and cache.
+env_copy_buffer_chunks = int(os.getenv("CACHE_COPY_BUFFER_CHUNKS", "64"))
+
+# seconds a (cache_func, repo_id) pair is considered fresh after it was
+# last written; refresh requests inside that window are skipped.
+env_refresh_min_age = int(os.getenv("CACHE_REFRESH_MIN_AGE", "3600"))
+
+# estimated size the cached data may grow to before least-recently-used
+# (cache_func, repo_id) pairs are evicted. 0 means unbounded.
+env_size_budget_bytes = int(os.getenv("CACHE_SIZE_BUDGET_MB", "0")) * 1024 * 1024
+
+# what a collection task does with repos another task is already collecting:
+# "wait" for that task (and pick up what it failed to cache), or "skip" them.
+env_inflight_policy = os.getenv("CACHE_INFLIGHT_POLICY", "wait")
+# seconds a task waits on in-flight repos before giving up on them.
+env_inflight_timeout = float(os.getenv("CACHE_INFLIGHT_TIMEOUT", "600"))
+
+# process-wide connection pools, see pools.py
+env_cache_pool_size = int(os.getenv("CACHE_POOL_MAX_CONNECTIONS", "10"))
+env_augur_pool_size = int(os.getenv("AUGUR_POOL_MAX_CONNECTIONS", "4"))
+# ADBC connections of the columnar read path, see arrow_cache.py
+env_arrow_pool_size = int(os.getenv("ARROW_POOL_MAX_CONNECTIONS", "4"))
+# seconds an idle pooled connection is kept before it's closed
+env_pool_max_idle = float(os.getenv("POOL_MAX_IDLE_SECONDS", "300"))
+# seconds to wait for a connection when a pool is exhausted
+env_pool_checkout_timeout = float(os.getenv("POOL_CHECKOUT_TIMEOUT", "30"))
+# seconds pool metrics a celery worker process reported stay visible to the API
+env_pool_stats_ttl = int(os.getenv("POOL_STATS_TTL", "600"))
+
 # purely initial startup string
 # psycopg2 connection string for cache pg instance, initialization only
 init_cx_string = "dbname={} user={} password={} host={} port={}".format(
@@ -38,10 +75,46 @@ init_cx_string = "dbname={} user={} password={} host={} port={}".format(
 )
 
 # psycopg2 connection string for cache pg instance
-cache_cx_string = "dbname={} user={} password={} host={} port={}".format(
+# sessions run in UTC so that naive timestamps from augur are stored,
+# and timestamptz values are returned, as UTC.
+cache_cx_string = "dbname={} user={} password={} host={} port={} options='-c timezone=UTC'".format(
     env_dbname, env_user, env_password, env_host, env_port
 )
 
+# URI form of the cache connection string, for drivers that don't take
+# libpq keyword strings (ADBC, see arrow_cache.py)
+cache_uri = "postgresql://{}:{}@{}:{}/{}?options={}".format(
+    quote(env_user, safe=""),
+    quote(env_password, safe=""),
+    env_host,
+    env_port,
+    env_dbname,
+    quote("-c timezone=UTC", safe=""),
+)
+
+# how retrieve_from_cache reads the cache.
+# "arrow" reads columnar with ADBC when it's installed, "rows" uses psycopg2 tuples.
+env_retrieval_mode = os.getenv("CACHE_RETRIEVAL_MODE", "arrow")
+
+# redis hot tier in front of retrieve_from_cache and the time-bin reads, see hot_tier.py.
+# seconds a frame stays in redis, 0 disables the tier.
+env_hot_tier_ttl = int(os.getenv("CACHE_HOT_TIER_TTL", "600"))
+# frames of a single (cache_func, repo_id) pair larger than this aren't put in redis.
+env_hot_tier_max_entry_bytes = int(os.getenv("CACHE_HOT_TIER_MAX_ENTRY_MB", "16")) * 1024 * 1024
+
+# seconds a graph request waits for its repos to be collected, see readiness.py.
+env_ready_timeout = float(os.getenv("CACHE_READY_TIMEOUT", "600"))
+# seconds between bookkeeping checks while waiting, in case a collection event was missed.
+env_ready_recheck = float(os.getenv("CACHE_READY_RECHECK", "30"))
+
+# seconds a rendered graph is kept in redis, see figure_cache.py. 0 disables the figure cache.
+env_figure_cache_ttl = int(os.getenv("FIGURE_CACHE_TTL", "3600"))
+
+# where time-series graphs bin their data.
+# "sql" counts per time-bin in the cache database, "pandas" reads every row and bins in python,
+# "rollup" sums the daily rollups (commits shared by several repos are counted once per repo).
+env_aggregation_mode = os.getenv("CACHE_AGGREGATION_MODE", "sql")
+
 # psycopg2 connection string for augur db
 db_cx_string = "dbname={} user={} password={} host={} port={}".format(
     env_augur_database,
@@ -50,3 +123,18 @@ db_cx_string = "dbname={} user={} password={} host={} port={}".format(
     env_augur_host,
     env_augur_port,
 )
+
+# admission control of queries against augur, see admission.py.
+# max concurrent augur queries per query type across all workers, 0 disables the limit.
+# AUGUR_MAX_CONCURRENT_QUERIES_<QUERY> (e.g. _COMMITS) overrides it for one query type.
+env_augur_max_concurrent = int(os.getenv("AUGUR_MAX_CONCURRENT_QUERIES", "4"))
+# seconds a query waits for a slot before it's rejected (and its task retried).
+env_augur_admission_timeout = float(os.getenv("AUGUR_ADMISSION_TIMEOUT", "300"))
+# seconds a slot is held at most, so slots of workers that died are reclaimed.
+env_augur_query_lease = float(os.getenv("AUGUR_QUERY_LEASE", "3600"))
+
+# cache prewarming from the selection access log, see access_log.py.
+# days of selections that count towards a selection's popularity.
+env_selection_log_days = int(os.getenv("SELECTION_LOG_DAYS", "14"))
+# most popular selections collected and refreshed in the background, 0 disables prewarming.
+env_prewarm_top_n = int(os.getenv("CACHE_PREWARM_TOP_N", "20"))
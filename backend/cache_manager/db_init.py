@@ -29,6 +29,9 @@ of the columns referenced in the SELECT statement has a
 corresponding column in the table schema defined below, with a
 type that matches the datatype we expect to receive from Augur.
 
+Every cache table is read by repo_id, so each table creation block
+is followed by a call to _create_repo_id_index for that table.
+
 Note also that we use the table creation syntax:
 CREATE UNLOGGED TABLE IF NOT EXISTS <name>
 
@@ -54,7 +57,9 @@ https://www.postgresql.org/docs/current/datatype.html
 Generally, 'int' is good for integers,
 'float4' is good for normal floats,
 'float8' is good for larger precision floats,
-'text' is best for text strings.
+'text' is best for text strings,
+'timestamptz' is best for timestamps. Cache connections run in UTC,
+so naive timestamps from Augur (e.g. timezone('utc', ...)) are stored as UTC.
     - why we aren't using 'varchar':
     https://wiki.postgresql.org/wiki/Don%27t_Do_This#Don.27t_use_varchar.28n.29_by_default
 """
@@ -67,6 +72,8 @@ import time
 # doesn't use relative import syntax "import .cx_common" because
 # cx_common is a neighbor of script, thus is available in PYTHON_PATH
 from cx_common import init_cx_string, cache_cx_string
+from rollups import DAILY_ROLLUPS, create_daily_rollup_tables, refresh_daily_rollups
+from collection_costs import create_collection_costs_table, record_collection_costs
 
 
 def _connect_with_retry(connection_string, max_retries=5, retry_delay=3):
@@ -133,16 +140,23 @@ def _create_application_database() -> None:
     conn.close()
 
 
+def _create_repo_id_index(cur, table: str) -> None:
+    """
+    Every read and every bookkeeping-driven lookup against a cache
+    table filters on repo_id, so each cache table gets a btree on it.
+    """
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_repo_id_idx ON {table} (repo_id)")
+
+
 def _create_application_tables() -> None:
     """
     Creates tables for cached data in 'augur_cache' database.
 
     Tables created:
         - commits
+        - daily rollups (see rollups.py)
         - cache_bookkeeping
     """
-    # TODO: timestamps being stored as strings- don't need to do that anymore.
-
     # connect to application database
     conn = _connect_with_retry(cache_cx_string)
 
@@ -155,12 +169,13 @@ def _create_application_tables() -> None:
                 repo_id int,
                 commit_hash text, -- this is the commit hash, so it's base64 hash.
                 author_email text,
-                author_date text,
-                author_timestamp text,
-                committer_timestamp text)
+                author_date timestamptz,
+                author_timestamp timestamptz,
+                committer_timestamp timestamptz)
             """
         )
         logging.warning("CREATED commits TABLE")
+        _create_repo_id_index(cur, "commits_query")
 
         cur.execute(
             """
@@ -172,34 +187,36 @@ def _create_application_tables() -> None:
                 gh_issue bigint,
                 reporter_id text,
                 issue_closer text,
-                created_at text,
-                closed_at text
+                created_at timestamptz,
+                closed_at timestamptz
             )
             """
         )
         logging.warning("CREATED issues TABLE")
+        _create_repo_id_index(cur, "issues_query")
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS prs_query(
                 repo_id int,
                 repo_name text,
-                pull_request_id int,
-                pr_src_number int,
+                pull_request_id bigint,
+                pr_src_number bigint,
                 cntrb_id text,
-                created_at text,
-                closed_at text,
-                merged_at text
+                created_at timestamptz,
+                closed_at timestamptz,
+                merged_at timestamptz
             )
             """
         )
         logging.warning("CREATED prs TABLE")
+        _create_repo_id_index(cur, "prs_query")
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS affiliation_query(
                 cntrb_id text,
-                created_at text,
+                created_at timestamptz,
                 repo_id int,
                 login text,
                 action text,
@@ -210,6 +227,7 @@ def _create_application_tables() -> None:
             """
         )
         logging.warning("CREATED affiliation_query TABLE")
+        _create_repo_id_index(cur, "affiliation_query")
 
         cur.execute(
             """
@@ -217,7 +235,7 @@ def _create_application_tables() -> None:
                 repo_id int,
                 repo_name text,
                 cntrb_id text,
-                created_at text,
+                created_at timestamptz,
                 login text,
                 action text,
                 rank int
@@ -225,36 +243,39 @@ def _create_application_tables() -> None:
             """
         )
         logging.warning("CREATED contributors TABLE")
+        _create_repo_id_index(cur, "contributors_query")
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS issue_assignee_query(
-                issue_id text,
+                issue_id bigint,
                 repo_id int,
-                created_at text,
-                closed_at text,
-                assign_date text,
+                created_at timestamptz,
+                closed_at timestamptz,
+                assign_date timestamptz,
                 assignment_action text,
                 assignee text
             )
             """
         )
         logging.warning("CREATED issue_assignments TABLE")
+        _create_repo_id_index(cur, "issue_assignee_query")
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS pr_assignee_query(
-                pull_request_id int,
+                pull_request_id bigint,
                 repo_id int,
-                created_at text,
-                closed_at text,
-                assign_date text,
+                created_at timestamptz,
+                closed_at timestamptz,
+                assign_date timestamptz,
                 assignment_action text,
                 assignee text
             )
             """
         )
         logging.warning("CREATED pr_assignments TABLE")
+        _create_repo_id_index(cur, "pr_assignee_query")
 
         # Commented out tables - not currently needed
         # cur.execute(
@@ -305,6 +326,7 @@ def _create_application_tables() -> None:
             """
         )
         logging.warning("CREATED repo_languages_query TABLE")
+        _create_repo_id_index(cur, "repo_languages_query")
 
         cur.execute(
             """
@@ -319,19 +341,21 @@ def _create_application_tables() -> None:
             """
         )
         logging.warning("CREATED package_version_query TABLE")
+        _create_repo_id_index(cur, "package_version_query")
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS repo_releases_query(
                 repo_id int,
                 release_name text,
-                release_created_at text,
-                release_published_at text,
-                release_updated_at text
+                release_created_at timestamptz,
+                release_published_at timestamptz,
+                release_updated_at timestamptz
             )
             """
         )
         logging.warning("CREATED repo_releases_query TABLE")
+        _create_repo_id_index(cur, "repo_releases_query")
 
         cur.execute(
             """
@@ -344,6 +368,7 @@ def _create_application_tables() -> None:
             """
         )
         logging.warning("CREATED ossf_score_query TABLE")
+        _create_repo_id_index(cur, "ossf_score_query")
 
         cur.execute(
             """
@@ -362,32 +387,46 @@ def _create_application_tables() -> None:
             """
         )
         logging.warning("CREATED repo_info_query TABLE")
+        _create_repo_id_index(cur, "repo_info_query")
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS pr_response_query(
-                pull_request_id int,
+                pull_request_id bigint,
                 repo_id int,
                 cntrb_id text,
-                msg_timestamp text,
+                msg_timestamp timestamptz,
                 msg_cntrb_id text,
-                pr_created_at text,
-                pr_closed_at text
+                pr_created_at timestamptz,
+                pr_closed_at timestamptz
             )
             """
         )
         logging.warning("CREATED pr_response_query TABLE")
+        _create_repo_id_index(cur, "pr_response_query")
+
+        # per-(repo_id, day) counts of the tables above, kept up to date during ingest.
+        create_daily_rollup_tables(cur)
+
+        # rows per (cache_func, repo_id) at last collection, for sharding collection by cost.
+        create_collection_costs_table(cur)
 
         cur.execute(
             """
             CREATE UNLOGGED TABLE IF NOT EXISTS cache_bookkeeping(
                 cache_func text,
                 repo_id int,
-                ts_cached timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ts_cached timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                watermark timestamp, -- high-water mark for incremental refresh, NULL if not tracked
+                ts_accessed timestamp, -- last read, for LRU eviction
+                PRIMARY KEY (cache_func, repo_id)
             )
             """
         )
         logging.warning("CREATED cache_bookkeeping TABLE")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS cache_bookkeeping_lru_idx ON cache_bookkeeping (COALESCE(ts_accessed, ts_cached))"
+        )
 
         # commit changes, all-or-nothing.
         conn.commit()
@@ -395,6 +434,214 @@ def _create_application_tables() -> None:
     logging.warning("ALL TABLES COMMITTED SUCCESSFULLY")
 
 
+"""
+SCHEMA_VERSIONING:
+
+Tables are created with "IF NOT EXISTS", so changing a definition
+above doesn't change a table that an existing cache already has.
+When an existing table's definition changes, bump CACHE_SCHEMA_VERSION
+and register a function in _MIGRATIONS that brings a cache at the
+previous version up to the new one.
+
+The applied version is recorded in 'cache_schema_version'. A cache
+that has tables but no version record predates versioning and is
+treated as version 1. A cache without tables is created directly at
+the current version and needs no migrations.
+"""
+
+CACHE_SCHEMA_VERSION = 7
+
+# columns that were stored as text (or int) in schema version 1
+_V2_RETYPED_COLUMNS = {
+    "commits_query": {
+        "author_date": "timestamptz",
+        "author_timestamp": "timestamptz",
+        "committer_timestamp": "timestamptz",
+    },
+    "issues_query": {
+        "created_at": "timestamptz",
+        "closed_at": "timestamptz",
+    },
+    "prs_query": {
+        "pull_request_id": "bigint",
+        "pr_src_number": "bigint",
+        "created_at": "timestamptz",
+        "closed_at": "timestamptz",
+        "merged_at": "timestamptz",
+    },
+    "affiliation_query": {
+        "created_at": "timestamptz",
+    },
+    "contributors_query": {
+        "created_at": "timestamptz",
+    },
+    "issue_assignee_query": {
+        "issue_id": "bigint",
+        "created_at": "timestamptz",
+        "closed_at": "timestamptz",
+        "assign_date": "timestamptz",
+    },
+    "pr_assignee_query": {
+        "pull_request_id": "bigint",
+        "created_at": "timestamptz",
+        "closed_at": "timestamptz",
+        "assign_date": "timestamptz",
+    },
+    "repo_releases_query": {
+        "release_created_at": "timestamptz",
+        "release_published_at": "timestamptz",
+        "release_updated_at": "timestamptz",
+    },
+    "pr_response_query": {
+        "pull_request_id": "bigint",
+        "msg_timestamp": "timestamptz",
+        "pr_created_at": "timestamptz",
+        "pr_closed_at": "timestamptz",
+    },
+}
+
+
+def _migrate_v2_typed_columns(cur) -> None:
+    """
+    Version 2: timestamps stored as timestamptz instead of text,
+    Augur bigint ids stored as bigint.
+    """
+    for table, columns in _V2_RETYPED_COLUMNS.items():
+        alterations = ", ".join(
+            f"ALTER COLUMN {column} TYPE {col_type} USING {column}::{col_type}" for column, col_type in columns.items()
+        )
+        cur.execute(f"ALTER TABLE IF EXISTS {table} {alterations}")
+        logging.warning(f"MIGRATED {table} TO TYPED COLUMNS")
+
+
+def _migrate_v3_bookkeeping_key(cur) -> None:
+    """
+    Version 3: cache_bookkeeping gets a primary key on (cache_func, repo_id).
+
+    Bookkeeping used to be appended to without a key, so duplicate
+    pairs are collapsed (keeping the earliest) before adding it.
+    repo_id indexes are created by _create_application_tables.
+    """
+    cur.execute(
+        """
+        DELETE FROM cache_bookkeeping cb
+        USING cache_bookkeeping dup
+        WHERE cb.cache_func = dup.cache_func
+            AND cb.repo_id = dup.repo_id
+            AND (cb.ts_cached, cb.ctid) > (dup.ts_cached, dup.ctid)
+        """
+    )
+    cur.execute("DELETE FROM cache_bookkeeping WHERE cache_func IS NULL OR repo_id IS NULL")
+    cur.execute("ALTER TABLE cache_bookkeeping ADD PRIMARY KEY (cache_func, repo_id)")
+    logging.warning("MIGRATED cache_bookkeeping TO KEYED TABLE")
+
+
+def _migrate_v4_bookkeeping_watermark(cur) -> None:
+    """
+    Version 4: cache_bookkeeping records a per-pair watermark for incremental refresh.
+    Existing pairs start without one; it's derived from cached rows on first refresh.
+    """
+    cur.execute("ALTER TABLE cache_bookkeeping ADD COLUMN IF NOT EXISTS watermark timestamp")
+    logging.warning("MIGRATED cache_bookkeeping TO TRACK WATERMARKS")
+
+
+def _migrate_v5_bookkeeping_access(cur) -> None:
+    """
+    Version 5: cache_bookkeeping records when each pair was last read, for LRU eviction.
+    """
+    cur.execute("ALTER TABLE cache_bookkeeping ADD COLUMN IF NOT EXISTS ts_accessed timestamp")
+    cur.execute("CREATE INDEX IF NOT EXISTS cache_bookkeeping_lru_idx ON cache_bookkeeping (COALESCE(ts_accessed, ts_cached))")
+    logging.warning("MIGRATED cache_bookkeeping TO TRACK ACCESS")
+
+
+def _migrate_v6_daily_rollups(cur) -> None:
+    """
+    Version 6: daily rollup tables, built from the rows already cached.
+    """
+    create_daily_rollup_tables(cur)
+    for target_table in DAILY_ROLLUPS:
+        cur.execute(f"SELECT DISTINCT repo_id FROM {target_table}")
+        repolist = [repo_id for (repo_id,) in cur.fetchall() if repo_id is not None]
+        refresh_daily_rollups(cur, target_table, target_table, repolist)
+    logging.warning("MIGRATED CACHE TO DAILY ROLLUPS")
+
+
+def _migrate_v7_collection_costs(cur) -> None:
+    """
+    Version 7: per-repo collection costs, recorded from the rows already cached.
+    """
+    create_collection_costs_table(cur)
+    cur.execute("SELECT cache_func, array_agg(repo_id) FROM cache_bookkeeping GROUP BY cache_func")
+    for func_name, repolist in cur.fetchall():
+        cur.execute("SELECT to_regclass(%s)", (f"{func_name}_query",))
+        if cur.fetchone()[0] is not None:
+            record_collection_costs(cur, func_name, f"{func_name}_query", repolist)
+    logging.warning("MIGRATED CACHE TO COLLECTION COSTS")
+
+
+# schema version -> function that migrates a cache from (version - 1) to version
+_MIGRATIONS = {
+    2: _migrate_v2_typed_columns,
+    3: _migrate_v3_bookkeeping_key,
+    4: _migrate_v4_bookkeeping_watermark,
+    5: _migrate_v5_bookkeeping_access,
+    6: _migrate_v6_daily_rollups,
+    7: _migrate_v7_collection_costs,
+}
+
+
+def _get_schema_version(cur) -> int:
+    """
+    Returns the schema version of the cache, 0 if the cache has no tables yet.
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_schema_version(
+            version int NOT NULL,
+            ts_applied timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    cur.execute("SELECT max(version) FROM cache_schema_version")
+    version = cur.fetchone()[0]
+    if version is not None:
+        return version
+
+    # no version recorded- either a fresh cache or one from before versioning.
+    cur.execute("SELECT to_regclass('cache_bookkeeping')")
+    return 0 if cur.fetchone()[0] is None else 1
+
+
+def _migrate_application_tables() -> None:
+    """
+    Brings the tables of an existing cache up to CACHE_SCHEMA_VERSION.
+
+    Must run before _create_application_tables so that a fresh cache
+    can be told apart from an unversioned one.
+    """
+    conn = _connect_with_retry(cache_cx_string)
+
+    with conn.cursor() as cur:
+        version = _get_schema_version(cur)
+
+        if version == 0:
+            # fresh cache, tables will be created at the current version.
+            logging.warning(f"FRESH CACHE, SCHEMA VERSION {CACHE_SCHEMA_VERSION}")
+            cur.execute("INSERT INTO cache_schema_version (version) VALUES (%s)", (CACHE_SCHEMA_VERSION,))
+        else:
+            for target in range(version + 1, CACHE_SCHEMA_VERSION + 1):
+                logging.warning(f"MIGRATING CACHE SCHEMA {target - 1} -> {target}")
+                _MIGRATIONS[target](cur)
+                cur.execute("INSERT INTO cache_schema_version (version) VALUES (%s)", (target,))
+
+        # commit changes, all-or-nothing.
+        conn.commit()
+
+    conn.close()
+    logging.warning("CACHE SCHEMA UP TO DATE")
+
+
 def db_init() -> int:
     try:
         # don't need to check return values- errors propogate as exceptions,
@@ -403,6 +650,9 @@ def db_init() -> int:
         # create augur_cache db if it doesn't already exist.
         _create_application_database()
 
+        # bring existing tables up to the current schema version.
+        _migrate_application_tables()
+
         # add tables to augur_cache db if they don't already exist.
         _create_application_tables()
 
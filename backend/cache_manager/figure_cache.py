@@ -0,0 +1,78 @@
+"""
+Cache of rendered graphs.
+
+Rendering a graph (building the plotly figure and serializing it to
+HTML) costs more than reading its data, and the same repo set and
+interval are typically shown to many users in a row. Rendered graphs
+are kept in the redis hot tier for FIGURE_CACHE_TTL seconds.
+
+A graph is identified by the visualization, the sorted repo set, the
+interval, the version of the cached data it was drawn from (see
+cache_facade.get_data_version) and the current date, since the visible
+time window moves with it. The same key is the graph's ETag, so a
+client holding it can revalidate with If-None-Match and skip the body.
+"""
+import datetime as dt
+import hashlib
+import json
+import logging
+
+from .cx_common import env_figure_cache_ttl
+from .cache_manager import get_cache_manager
+
+# CacheManager namespace for rendered graphs
+_FIGURE_FUNC = "figure"
+
+
+def figure_key(visualization: str, repolist: list[int], interval, data_version: str) -> str:
+    """
+    Returns the key of a rendered graph.
+
+    Args:
+        visualization (str): name of the visualization
+        repolist (list[int]): repos shown, in any order
+        interval (str | int): interval shown
+        data_version (str): version of the data it's drawn from
+
+    Returns:
+        str: the key
+    """
+    canonical = json.dumps(
+        [visualization, sorted(set(int(r) for r in repolist)), interval, data_version, str(dt.date.today())]
+    )
+    return hashlib.md5(canonical.encode("utf-8")).hexdigest()
+
+
+def etag(key: str) -> str:
+    """The ETag header value of a rendered graph."""
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: str | None, key: str) -> bool:
+    """Whether an If-None-Match header value names the graph of {key}."""
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag(key) in tags
+
+
+def get_figure(key: str) -> str | None:
+    """Returns the rendered graph of {key}, None if it isn't cached."""
+    if env_figure_cache_ttl <= 0:
+        return None
+    try:
+        figure = get_cache_manager().get(_FIGURE_FUNC, key)
+    except Exception as e:
+        logging.error(f"FIGURE CACHE UNAVAILABLE: {e}")
+        return None
+    return figure.decode("utf-8") if figure is not None else None
+
+
+def put_figure(key: str, figure: str) -> None:
+    """Caches the rendered graph of {key}."""
+    if env_figure_cache_ttl <= 0:
+        return
+    try:
+        get_cache_manager().set(_FIGURE_FUNC, key, figure, ttl=env_figure_cache_ttl)
+    except Exception as e:
+        logging.error(f"FIGURE CACHE WRITE FAILED: {e}")
@@ -0,0 +1,171 @@
+"""
+Redis hot tier in front of the postgres cache.
+
+Popular repos are read over and over, and every read used to query the
+postgres cache and build a DataFrame from the rows again. The frames of
+each (cache_func, repo_id) pair are kept in redis instead, feather
+serialized, for CACHE_HOT_TIER_TTL seconds. A read only goes to postgres
+for the pairs redis doesn't have.
+
+Frames are stored under a per-pair generation. Whenever the bookkeeping
+of a pair changes (data collected, refreshed or evicted), the writer
+bumps the generation after committing, and frames of older generations
+are never read again. A reader that raced with the writer stores what
+it read under the generation it saw before reading, so it can't put
+stale data under the new generation.
+
+Redis memory is capped by the server's maxmemory; with a 'volatile-lru'
+policy the frames (which have a TTL) are evicted and the generations
+(which don't) are kept.
+
+Reads served from redis aren't recorded in cache_bookkeeping for LRU
+eviction; a popular pair is still read from postgres once per TTL.
+
+retrieve_from_cache reads through the tier per pair, see read_through.
+The time-bin reads of CACHE_AGGREGATION_MODE "sql" and "rollup" can't
+be split per repo (a commit shared by two repos is counted once), so
+their results are stored per whole repo selection instead, under the
+generations of all of its pairs, see read_through_selection.
+
+Reading requires pyarrow for feather; without it reads go straight to
+postgres. Invalidation doesn't need pyarrow, so writers (celery
+workers, the evictor) bump generations even without it.
+"""
+import hashlib
+import json
+import logging
+
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from .cx_common import env_hot_tier_ttl, env_hot_tier_max_entry_bytes
+from .cache_manager import get_cache_manager
+
+
+def hot_tier_enabled() -> bool:
+    """Whether reads go through redis."""
+    return env_hot_tier_ttl > 0 and pyarrow is not None
+
+
+def selection_tag(columns=None, time_column=None, start=None, end=None, filters=None) -> str:
+    """
+    Identifies what's read for a pair, so frames of different projections
+    and filters of the same pair are stored separately.
+    """
+    selection = json.dumps([columns, time_column, start, end, filters], default=str, sort_keys=True)
+    return hashlib.md5(selection.encode("utf-8")).hexdigest()
+
+
+def read_through(func_name: str, repolist: list[int], tag: str, load) -> pd.DataFrame:
+    """
+    Returns the frames of the repos of {repolist}, from redis where possible.
+
+    Args:
+        func_name (str): cache function the frames belong to
+        repolist (list[int]): repos to read
+        tag (str): selection_tag of the read
+        load (callable): load(repos) reads the given repos from postgres; the
+            frame it returns must have a repo_id column.
+
+    Returns:
+        pd.DataFrame: rows of all repos of {repolist}
+    """
+    repos = list(dict.fromkeys(repolist))
+    if not repos:
+        return load(repos)
+    manager = get_cache_manager()
+
+    try:
+        generations = manager.generationsm(func_name, repos)
+        hits = manager.getm_frames(func_name, repos, generations, tag)
+    except Exception as e:
+        logging.error(f"{func_name} - HOT TIER UNAVAILABLE, READING POSTGRES: {e}")
+        return load(repos)
+
+    missing = [r for r in repos if r not in hits]
+    frames = [hits[r] for r in repos if r in hits]
+    logging.warning(f"{func_name} - HOT TIER - {len(hits)} HIT, {len(missing)} MISSED")
+
+    if missing:
+        df = load(missing)
+        by_repo = {int(repo_id): group for repo_id, group in df.groupby("repo_id", sort=False)}
+        missing_generations = [g for r, g in zip(repos, generations) if r not in hits]
+        try:
+            # repos without rows are stored too, so they don't miss again.
+            manager.setm_frames(
+                func_name,
+                missing,
+                missing_generations,
+                [by_repo.get(r, df.iloc[0:0]) for r in missing],
+                tag,
+                ttl=env_hot_tier_ttl,
+                max_bytes=env_hot_tier_max_entry_bytes,
+            )
+        except Exception as e:
+            logging.error(f"{func_name} - HOT TIER WRITE FAILED: {e}")
+        frames.append(df)
+
+    # concat of empty frames can change dtypes; skip them unless there's nothing else.
+    non_empty = [f for f in frames if not f.empty]
+    if not non_empty:
+        return frames[0].reset_index(drop=True)
+    return pd.concat(non_empty, ignore_index=True)
+
+
+def read_through_selection(func_name: str, repolist: list[int], tag: str, load) -> pd.DataFrame:
+    """
+    Returns the result of a read of the whole selection {repolist}, from
+    redis if it was read since any of its pairs last changed.
+
+    Args:
+        func_name (str): cache function the result belongs to
+        repolist (list[int]): repos of the selection
+        tag (str): selection_tag of the read
+        load (callable): load() reads the selection from postgres
+
+    Returns:
+        pd.DataFrame: the result of the read
+    """
+    repos = sorted(set(repolist))
+    if not repos:
+        return load()
+    manager = get_cache_manager()
+
+    try:
+        generations = manager.generationsm(func_name, repos)
+        hit = manager.get_selection_frame(func_name, repos, generations, tag)
+    except Exception as e:
+        logging.error(f"{func_name} - HOT TIER UNAVAILABLE, READING POSTGRES: {e}")
+        return load()
+
+    logging.warning(f"{func_name} - HOT TIER - SELECTION {'HIT' if hit is not None else 'MISSED'}")
+    if hit is not None:
+        return hit
+
+    df = load()
+    try:
+        manager.set_selection_frame(
+            func_name, repos, generations, df, tag, ttl=env_hot_tier_ttl, max_bytes=env_hot_tier_max_entry_bytes
+        )
+    except Exception as e:
+        logging.error(f"{func_name} - HOT TIER WRITE FAILED: {e}")
+    return df
+
+
+def invalidate(func_name: str, repolist: list[int]) -> None:
+    """
+    Orphans the frames of each (func_name, repo_id) pair. Call after
+    committing a change to the pairs' bookkeeping.
+    """
+    # independent of pyarrow: readers in other processes may have it.
+    if env_hot_tier_ttl <= 0 or not repolist:
+        return
+    try:
+        get_cache_manager().invalidatem(func_name, list(repolist))
+    except Exception as e:
+        # frames expire with their TTL regardless.
+        logging.error(f"{func_name} - HOT TIER INVALIDATION FAILED: {e}")
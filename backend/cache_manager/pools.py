@@ -0,0 +1,319 @@
+"""
+Process-wide connection pools for the postgres cache and the Augur database.
+
+Opening a psycopg2 connection costs a TCP handshake, authentication and
+backend startup on the server, which is more than most of the queries we
+run against the cache. Every process keeps one pool per database instead,
+and application code borrows connections from it.
+
+Pools don't survive fork(): a connection inherited by a Celery prefork
+child shares its socket with the parent, so using or closing it from the
+child corrupts the parent's session. Each pool remembers the pid that
+created its connections and silently forgets them in any other process.
+Celery additionally calls reset_pools() on worker_process_init.
+
+The API and the Celery workers are separate processes, so each worker
+process reports its pool metrics to the coordination redis (the celery
+broker) after every task, see publish_pool_stats and worker_pool_stats.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2 as pg
+import redis
+from psycopg2 import extensions as pg_extensions
+
+from .cx_common import (
+    db_cx_string,
+    cache_cx_string,
+    env_augur_schema,
+    env_cache_pool_size,
+    env_augur_pool_size,
+    env_pool_max_idle,
+    env_pool_checkout_timeout,
+    env_pool_stats_ttl,
+)
+
+
+class ConnectionPool:
+    """
+    Thread-safe LIFO pool of psycopg2 connections.
+
+    LIFO keeps the set of warm connections small: under light load the
+    same few connections are reused and the rest age out after {max_idle}
+    seconds instead of being cycled round-robin.
+
+    Attributes
+    ----------
+        name : str
+            Label used in logs and metrics.
+
+        max_size : int
+            Max connections open at once, idle and in use.
+
+        max_idle : float
+            Idle connections older than this many seconds are closed
+            instead of reused.
+
+    Methods
+    -------
+        getconn() :
+            Borrows a connection, waiting up to {checkout_timeout} seconds
+            if the pool is exhausted.
+
+        putconn(conn, discard) :
+            Returns a connection; broken or discarded connections are closed.
+
+        connection() :
+            Context manager that borrows a connection and commits on
+            success / rolls back on error, like `with pg.connect(...)`.
+
+        stats() :
+            Pool size, idle time and reuse counters.
+
+        reset() :
+            Forgets all connections, e.g. after fork.
+
+    Subclasses pool other drivers by overriding _connect, _is_open and
+    _is_reusable.
+    """
+
+    def __init__(self, name, dsn, max_size, max_idle, checkout_timeout, **connect_kwargs):
+        self.name = name
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.checkout_timeout = checkout_timeout
+        self._dsn = dsn
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._init_state()
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        # (connection, time returned to pool)
+        self._idle = []
+        self._in_use = 0
+        self._counters = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkouts_reused": 0,
+            "checkout_waits": 0,
+            "checkout_timeouts": 0,
+            "idle_seconds_total": 0.0,
+        }
+
+    def reset(self):
+        """Forgets every connection without closing it; closing would send a
+        terminate message over a socket the parent process still uses.
+        """
+        with self._cond:
+            self._init_state()
+            self._cond.notify_all()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            logging.warning(f"{self.name} POOL - FORKED, DISCARDING INHERITED CONNECTIONS")
+            self._init_state()
+
+    def _connect(self):
+        return pg.connect(self._dsn, **self._connect_kwargs)
+
+    def _is_open(self, conn):
+        return not conn.closed
+
+    def _is_reusable(self, conn):
+        # returned outside a transaction, and not switched to autocommit.
+        return (
+            not conn.closed
+            and conn.info.transaction_status == pg_extensions.TRANSACTION_STATUS_IDLE
+            and not conn.autocommit
+        )
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._counters["connections_closed"] += 1
+
+    def getconn(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            self._check_pid()
+            while True:
+                # reuse the most recently returned connection that's still fresh.
+                now = time.monotonic()
+                while self._idle:
+                    conn, released = self._idle.pop()
+                    idle_for = now - released
+                    if not self._is_open(conn) or idle_for > self.max_idle:
+                        self._close(conn)
+                        continue
+                    self._in_use += 1
+                    self._counters["checkouts"] += 1
+                    self._counters["checkouts_reused"] += 1
+                    self._counters["idle_seconds_total"] += idle_for
+                    return conn
+
+                if self._in_use < self.max_size:
+                    # reserve the slot, connect outside the lock.
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["checkout_timeouts"] += 1
+                    raise TimeoutError(f"{self.name} pool exhausted ({self.max_size} connections in use)")
+                self._counters["checkout_waits"] += 1
+                self._cond.wait(remaining)
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._counters["connections_created"] += 1
+            self._counters["checkouts"] += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                # borrowed before a fork, nothing to give back to.
+                return
+
+            self._in_use -= 1
+            if discard or not self._is_reusable(conn):
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection for one transaction.
+
+        Commits when the block exits normally and rolls back when it
+        raises, like psycopg2's `with connection:` block.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        with self._cond:
+            self._check_pid()
+            reused = self._counters["checkouts_reused"]
+            return {
+                "name": self.name,
+                "pid": self._pid,
+                "max_size": self.max_size,
+                "size": self._in_use + len(self._idle),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "reuse_ratio": reused / self._counters["checkouts"] if self._counters["checkouts"] else 0.0,
+                "avg_idle_seconds": self._counters["idle_seconds_total"] / reused if reused else 0.0,
+                **self._counters,
+            }
+
+
+cache_pool = ConnectionPool(
+    name="cache",
+    dsn=cache_cx_string,
+    max_size=env_cache_pool_size,
+    max_idle=env_pool_max_idle,
+    checkout_timeout=env_pool_checkout_timeout,
+)
+
+augur_pool = ConnectionPool(
+    name="augur",
+    dsn=db_cx_string,
+    max_size=env_augur_pool_size,
+    max_idle=env_pool_max_idle,
+    checkout_timeout=env_pool_checkout_timeout,
+    options=f"-c search_path={env_augur_schema}",
+)
+
+
+def reset_pools():
+    """Forgets all pooled connections of this process, e.g. in a freshly forked worker."""
+    cache_pool.reset()
+    augur_pool.reset()
+
+
+def pool_stats():
+    """Metrics of the pools in this process; 'arrow' is None without the arrow extra."""
+    # arrow_cache builds on this module, so it's imported late.
+    from .arrow_cache import arrow_pool
+
+    return {
+        "cache": cache_pool.stats(),
+        "augur": augur_pool.stats(),
+        "arrow": arrow_pool.stats() if arrow_pool is not None else None,
+    }
+
+
+_stats_client: redis.StrictRedis | None = None
+
+
+def _get_stats_client() -> redis.StrictRedis:
+    global _stats_client
+    if _stats_client is None:
+        _stats_client = redis.StrictRedis(host=os.getenv("REDIS_HOST", "redis"), port=6379, db=0)
+    return _stats_client
+
+
+def publish_pool_stats() -> None:
+    """
+    Reports the pool metrics of this process for worker_pool_stats.
+    Reports expire after POOL_STATS_TTL seconds, so processes that exit
+    drop out on their own.
+    """
+    try:
+        _get_stats_client().set(
+            f"pool-stats:{socket.gethostname()}:{os.getpid()}",
+            json.dumps({"reported_at": time.time(), **pool_stats()}),
+            ex=env_pool_stats_ttl,
+        )
+    except redis.RedisError as e:
+        logging.error(f"POOLS - COULDN'T PUBLISH STATS: {e}")
+
+
+def worker_pool_stats() -> dict[str, dict]:
+    """
+    Latest pool metrics reported by each celery worker process.
+
+    Returns:
+        dict[str, dict]: "hostname:pid" -> reported_at and pool_stats() of that process
+    """
+    client = _get_stats_client()
+    keys = sorted(client.scan_iter(match="pool-stats:*"))
+    if not keys:
+        return {}
+    return {
+        key.decode("utf-8").removeprefix("pool-stats:"): json.loads(value)
+        for key, value in zip(keys, client.mget(keys))
+        # expired between the scan and the read.
+        if value is not None
+    }
@@ -0,0 +1,132 @@
+"""
+Collection events, so that requests waiting on data don't poll for it.
+
+Graph requests for repos that aren't cached yet used to re-check
+bookkeeping every half second, which cost a cache connection and a query
+per waiting request, and never ended if collection failed.
+
+Instead, every committed ingest publishes the (cache_func, repo_ids) it
+cached on a redis channel of its cache function, and a collection that
+finally failed publishes the repos it gave up on. Waiters subscribe,
+check bookkeeping once, and then sleep until an event (or their
+deadline) wakes them. See cache_facade.wait_until_cached.
+
+Redis pub/sub is fire-and-forget, so waiters still re-check bookkeeping
+every CACHE_READY_RECHECK seconds in case an event was lost.
+
+Celery task state transitions are published the same way, per task id,
+for clients that follow collection progress (see the task status
+WebSocket in api.py).
+"""
+import json
+import logging
+import os
+
+import redis
+import redis.asyncio as aredis
+
+_client: redis.StrictRedis | None = None
+_async_client: aredis.StrictRedis | None = None
+
+
+def _redis_kwargs() -> dict:
+    # the same redis as the hot tier, see CacheManager
+    return {
+        "host": os.getenv("REDIS_SERVICE_HOST", "redis-cache"),
+        "port": os.getenv("REDIS_SERVICE_PORT", "6379"),
+        "password": os.getenv("REDIS_PASSWORD", ""),
+    }
+
+
+def _get_client() -> redis.StrictRedis:
+    global _client
+    if _client is None:
+        _client = redis.StrictRedis(**_redis_kwargs())
+    return _client
+
+
+def _get_async_client() -> aredis.StrictRedis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aredis.StrictRedis(**_redis_kwargs())
+    return _async_client
+
+
+def channel(func_name: str) -> str:
+    """The channel collection events of {func_name} are published on."""
+    return f"cache-events:{func_name}"
+
+
+def _publish(func_name: str, repolist: list[int], status: str) -> None:
+    if not repolist:
+        return
+    try:
+        _get_client().publish(channel(func_name), json.dumps({"status": status, "repo_ids": list(repolist)}))
+    except Exception as e:
+        # waiters fall back on their periodic bookkeeping check.
+        logging.error(f"{func_name} - COLLECTION EVENT NOT PUBLISHED: {e}")
+
+
+def publish_cached(func_name: str, repolist: list[int]) -> None:
+    """Announces that the repos of {repolist} are cached. Call after committing."""
+    _publish(func_name, repolist, "cached")
+
+
+def publish_failed(func_name: str, repolist: list[int]) -> None:
+    """Announces that collecting the repos of {repolist} failed for good."""
+    _publish(func_name, repolist, "failed")
+
+
+def subscribe(func_name: str):
+    """Returns a pub/sub subscription to the collection events of {func_name}."""
+    pubsub = _get_client().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel(func_name))
+    return pubsub
+
+
+async def subscribe_async(func_name: str):
+    """Async version of subscribe."""
+    pubsub = _get_async_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(channel(func_name))
+    return pubsub
+
+
+def parse_event(message) -> dict | None:
+    """The event of a pub/sub message: {"status": "cached" | "failed", "repo_ids": [...]}."""
+    if message is None or message.get("type") != "message":
+        return None
+    return json.loads(message["data"])
+
+
+# celery states after which a task doesn't change anymore
+TASK_READY_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+def task_channel(task_id: str) -> str:
+    """The channel state transitions of task {task_id} are published on."""
+    return f"task-events:{task_id}"
+
+
+def publish_task_state(task_id: str, state: str, error: str | None = None) -> None:
+    """
+    Announces that task {task_id} entered celery state {state}.
+    The event has the fields of the API's TaskStatusInfo.
+    """
+    event = {
+        "job_id": task_id,
+        "status": state,
+        "ready": state in TASK_READY_STATES,
+        "result": "completed" if state == "SUCCESS" else None,
+        "error": error,
+    }
+    try:
+        _get_client().publish(task_channel(task_id), json.dumps(event))
+    except Exception as e:
+        logging.error(f"TASK {task_id} - STATE EVENT NOT PUBLISHED: {e}")
+
+
+async def subscribe_tasks_async(task_ids: list[str]):
+    """Returns an async pub/sub subscription to the state transitions of {task_ids}."""
+    pubsub = _get_async_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(*[task_channel(t) for t in task_ids])
+    return pubsub
@@ -0,0 +1,175 @@
+"""
+Daily rollups of cached event data.
+
+Time-series graphs only need counts per time-bin, but the cache stores
+one row per event, so every graph request re-counts every event of
+every repo it shows. The rollup tables here hold those counts per
+(repo_id, day). They're rebuilt from the cache tables inside the
+ingest transaction that changes them, so they're always exactly as
+fresh as the rows they summarize, and a graph at any interval can sum
+a few hundred rollup rows per repo instead of scanning its events.
+
+Every rollup column is a count that can be summed across days and
+repos. A commit that's in several repos (e.g. a fork) is counted once
+per repo.
+
+Used by both cache_facade (relative import) and db_init (run as a
+script from this directory), so this module has no package imports.
+"""
+import logging
+
+# cache table -> its daily rollup.
+#   table: name of the rollup table.
+#   cache_func: cache function whose (cache_func, repo_id) pairs own the rows.
+#   columns: rollup columns after (repo_id, day), and their SQL types.
+#   key: extra primary key columns after (repo_id, day).
+#   since: expression over a cache row for the earliest day the row counts
+#       towards. A changed row can only change rollup days from there on.
+#   select: SELECT producing rollup rows from the cache table 't', for the
+#       repos and days of the 'affected' table (repo_id, since).
+DAILY_ROLLUPS = {
+    "commits_query": {
+        "table": "commits_daily",
+        "cache_func": "commits",
+        "columns": {"commits": "int"},
+        "key": (),
+        "since": "author_date",
+        "select": """
+            SELECT t.repo_id, (t.author_date AT TIME ZONE 'UTC')::date AS day, count(DISTINCT t.commit_hash)
+            FROM commits_query t
+            JOIN affected a ON a.repo_id = t.repo_id
+            WHERE t.author_date >= a.since
+            GROUP BY 1, 2
+        """,
+    },
+    "prs_query": {
+        "table": "prs_daily",
+        "cache_func": "prs",
+        "columns": {"opened": "int", "merged": "int", "closed": "int"},
+        "key": (),
+        # a PR is closed or merged after it's opened.
+        "since": "created_at",
+        "select": """
+            SELECT
+                t.repo_id,
+                (e.ts AT TIME ZONE 'UTC')::date AS day,
+                count(DISTINCT t.pull_request_id) FILTER (WHERE e.kind = 'opened'),
+                count(DISTINCT t.pull_request_id) FILTER (WHERE e.kind = 'merged'),
+                count(DISTINCT t.pull_request_id) FILTER (WHERE e.kind = 'closed')
+            FROM prs_query t
+            JOIN affected a ON a.repo_id = t.repo_id
+            CROSS JOIN LATERAL (
+                VALUES ('opened', t.created_at), ('merged', t.merged_at), ('closed', t.closed_at)
+            ) AS e(kind, ts)
+            WHERE e.ts >= a.since
+            GROUP BY 1, 2
+        """,
+    },
+    "issues_query": {
+        "table": "issues_daily",
+        "cache_func": "issues",
+        "columns": {"opened": "int", "closed": "int"},
+        "key": (),
+        # an issue is closed after it's opened.
+        "since": "created_at",
+        "select": """
+            SELECT
+                t.repo_id,
+                (e.ts AT TIME ZONE 'UTC')::date AS day,
+                count(DISTINCT t.issue) FILTER (WHERE e.kind = 'opened'),
+                count(DISTINCT t.issue) FILTER (WHERE e.kind = 'closed')
+            FROM issues_query t
+            JOIN affected a ON a.repo_id = t.repo_id
+            CROSS JOIN LATERAL (
+                VALUES ('opened', t.created_at), ('closed', t.closed_at)
+            ) AS e(kind, ts)
+            WHERE e.ts >= a.since
+            GROUP BY 1, 2
+        """,
+    },
+    "contributors_query": {
+        "table": "contributors_daily",
+        "cache_func": "contributors",
+        "columns": {"actions": "int"},
+        "key": ("action",),
+        "since": "created_at",
+        "select": """
+            SELECT t.repo_id, (t.created_at AT TIME ZONE 'UTC')::date AS day, t.action, count(*)
+            FROM contributors_query t
+            JOIN affected a ON a.repo_id = t.repo_id
+            WHERE t.created_at >= a.since AND t.action IS NOT NULL
+            GROUP BY 1, 2, 3
+        """,
+    },
+}
+
+# cache function -> its rollup table
+ROLLUP_TABLES = {rollup["cache_func"]: rollup["table"] for rollup in DAILY_ROLLUPS.values()}
+
+
+def create_daily_rollup_tables(cur) -> None:
+    """
+    Creates the rollup tables that don't exist yet.
+    Like the cache tables they're unlogged; they can be rebuilt from them.
+    """
+    for rollup in DAILY_ROLLUPS.values():
+        key_columns = "".join(f"{k} text, " for k in rollup["key"])
+        value_columns = ", ".join(f"{c} {t} NOT NULL" for c, t in rollup["columns"].items())
+        cur.execute(
+            f"""
+            CREATE UNLOGGED TABLE IF NOT EXISTS {rollup['table']}(
+                repo_id int,
+                day date,
+                {key_columns}{value_columns},
+                PRIMARY KEY (repo_id, day{''.join(', ' + k for k in rollup['key'])})
+            )
+            """
+        )
+        logging.warning(f"CREATED {rollup['table']} TABLE")
+
+
+def refresh_daily_rollups(cur, target_table: str, changed_table: str, repolist: list[int]) -> None:
+    """
+    Rebuilds the rollup days of {target_table} that rows in {changed_table} affect.
+
+    For each repo of {repolist}, every rollup day from the earliest day a
+    changed row counts towards is rebuilt from {target_table}. For a full
+    load {changed_table} is {target_table} itself, so the repo's rollup
+    is rebuilt completely; for an incremental refresh it's the staging
+    table, so only the recent days the delta touches are.
+
+    Must run in the transaction that changed {target_table}, after the
+    changes. Tables without a rollup are ignored.
+
+    Args:
+        cur: cursor of the ingest transaction
+        target_table (str): cache table that changed
+        changed_table (str): table holding the new or changed rows
+        repolist (list[int]): repos whose rows changed
+    """
+    rollup = DAILY_ROLLUPS.get(target_table)
+    if rollup is None:
+        return
+
+    # table and column names are constants of this module, not user input.
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE affected ON COMMIT DROP AS
+        SELECT c.repo_id, date_trunc('day', min(c.{rollup['since']}), 'UTC') AS since
+        FROM {changed_table} c
+        WHERE c.repo_id = ANY(%(repo_ids)s::int[])
+        GROUP BY c.repo_id
+        """,
+        {"repo_ids": list(repolist)},
+    )
+    cur.execute(
+        f"""
+        DELETE FROM {rollup['table']} r
+        USING affected a
+        WHERE r.repo_id = a.repo_id AND r.day >= (a.since AT TIME ZONE 'UTC')::date
+        """
+    )
+    columns = ", ".join(("repo_id", "day") + rollup["key"] + tuple(rollup["columns"]))
+    cur.execute(f"INSERT INTO {rollup['table']} ({columns}) {rollup['select']}")
+    logging.warning(f"{rollup['table']} -- ROLLED UP {cur.rowcount} DAYS")
+    cur.execute("DROP TABLE affected")
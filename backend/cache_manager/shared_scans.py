@@ -0,0 +1,53 @@
+"""
+Shared-scan extraction of cache tables that read the same Augur relation.
+
+contributors and affiliation are both derived from
+explorer_contributor_actions for the same repos. Collected separately,
+every repo selection makes two full passes over that relation. A shared
+scan reads it once into a temporary table in the cache transaction and
+fans the rows out to each cache table from there.
+
+Other groups of queries don't share a relation: prs, pr_assignee and
+pr_response read pull_requests, explorer_pr_assignments and
+explorer_pr_response respectively, so a single pass can't serve them.
+"""
+
+# scan name -> shared scan.
+#   query: .sql file of the scan; takes the same %(repo_ids)s and
+#       %(since)s parameters as the per-table queries.
+#   columns: columns of the scan result and their SQL types, in order.
+#   outputs: cache function -> SELECT producing its cache table's rows,
+#       in column order, from the scan table {scan}, for %(repo_ids)s.
+SHARED_SCANS = {
+    "contributor_actions": {
+        "query": "contributor_actions",
+        "columns": {
+            "repo_id": "int",
+            "repo_name": "text",
+            "cntrb_id": "text",
+            "created_at": "timestamptz",
+            "login": "text",
+            "action": "text",
+            "rank": "int",
+            "cntrb_company": "text",
+            "email_list": "text",
+            "affiliated": "boolean",
+        },
+        "outputs": {
+            "contributors": """
+                SELECT repo_id, repo_name, cntrb_id, created_at, login, action, rank
+                FROM {scan}
+                WHERE repo_id = ANY(%(repo_ids)s::int[])
+            """,
+            # affiliation.sql groups identical actions into one row.
+            "affiliation": """
+                SELECT DISTINCT cntrb_id, created_at, repo_id, login, action, rank, cntrb_company, email_list
+                FROM {scan}
+                WHERE affiliated AND repo_id = ANY(%(repo_ids)s::int[])
+            """,
+        },
+    },
+}
+
+# cache function -> name of the shared scan that collects it
+SHARED_SCAN_OF = {func_name: name for name, scan in SHARED_SCANS.items() for func_name in scan["outputs"]}
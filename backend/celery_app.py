@@ -1,18 +1,106 @@
-from celery import Celery
+from celery import Celery, group
+from celery.result import GroupResult
+from celery.signals import (
+    worker_process_init,
+    beat_init,
+    task_prerun,
+    task_postrun,
+    task_success,
+    task_retry,
+    task_failure,
+)
 import logging
 import cache_manager.cache_facade as cf
+from cache_manager.pools import reset_pools, publish_pool_stats
+from cache_manager.readiness import publish_failed, publish_task_state
+from cache_manager.shared_scans import SHARED_SCANS, SHARED_SCAN_OF
+from cache_manager.access_log import top_selections, parse_selection
+from cache_manager.cx_common import env_prewarm_top_n
 import time
 from celery import Celery
 from dotenv import load_dotenv
 import os
 from pathlib import Path
 from functools import lru_cache
+import heapq
 
 load_dotenv()
 
 # Create Celery app
 app = Celery('tasks', broker=f'redis://{os.getenv("REDIS_HOST")}:6379/0', backend=f'redis://{os.getenv("REDIS_HOST")}:6379/0')
 
+# Collection priorities. The redis transport emulates priorities with one list
+# per step and, with the 'priority' order strategy, always drains lower steps
+# first: 0 is the highest priority.
+COLLECTION_PRIORITY_INTERACTIVE = 0  # a graph request is blocked on it
+COLLECTION_PRIORITY_DEFAULT = 3  # requested by a user, see run_tasks
+COLLECTION_PRIORITY_BACKGROUND = 9  # prefetch and maintenance
+
+app.conf.broker_transport_options = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+app.conf.task_default_priority = COLLECTION_PRIORITY_DEFAULT
+# workers reserve one task at a time, so a queued urgent task isn't stuck
+# behind background tasks a worker already prefetched.
+app.conf.worker_prefetch_multiplier = 1
+
+
+
+@worker_process_init.connect
+def _reset_connection_pools(**kwargs):
+    """Prefork children must not reuse connections opened by the parent."""
+    reset_pools()
+    publish_pool_stats()
+
+
+# the API reports worker pools from these, see pools.worker_pool_stats.
+@task_postrun.connect
+def _publish_pool_stats(**kwargs):
+    publish_pool_stats()
+
+
+# Task state transitions are pushed to clients following them instead of
+# being polled for, see readiness.py and the task status WebSocket in api.py.
+@task_prerun.connect
+def _publish_task_started(task_id=None, **kwargs):
+    publish_task_state(task_id, "STARTED")
+
+
+@task_success.connect
+def _publish_task_succeeded(sender=None, **kwargs):
+    publish_task_state(sender.request.id, "SUCCESS")
+
+
+@task_retry.connect
+def _publish_task_retrying(request=None, reason=None, **kwargs):
+    publish_task_state(request.id, "RETRY", error=str(reason))
+
+
+@task_failure.connect
+def _publish_task_failed(task_id=None, exception=None, **kwargs):
+    publish_task_state(task_id, "FAILURE", error=str(exception))
+
+
+# Periodic maintenance, run by `celery -A celery_app beat`
+app.conf.beat_schedule = {
+    "evict-cache": {
+        "task": "celery_app.evict_cache_task",
+        "schedule": float(os.getenv("CACHE_EVICTION_INTERVAL", "300")),
+    },
+    "prewarm-cache": {
+        "task": "celery_app.prewarm_cache_task",
+        "schedule": float(os.getenv("CACHE_PREWARM_INTERVAL", "3600")),
+    },
+}
+
+
+@beat_init.connect
+def _prewarm_on_start(**kwargs):
+    # after a deploy or cache wipe, don't wait a whole interval for the first prewarm.
+    prewarm_cache_task.apply_async(countdown=float(os.getenv("CACHE_PREWARM_START_DELAY", "60")))
+
 
 class SQLQueryLoader:
     """Loads SQL queries from external files."""
@@ -34,6 +122,294 @@ class SQLQueryLoader:
 # Initialize SQL loader
 sql_loader = SQLQueryLoader()
 
+# every query collected for a repo selection, see run_tasks
+COLLECTION_QUERIES = [
+    'repo_info', 'affiliation', 'commits',
+    'contributors', 'issue_assignee', 'issues',
+    'ossf_score', 'package_version', 'pr_assignee',
+    'pr_response', 'prs', 'repo_releases', 'repo_languages'
+]
+
+# max repos per collection task; larger repo lists are split into shards
+# that run in parallel and commit their bookkeeping independently.
+COLLECTION_SHARD_SIZE = int(os.getenv("COLLECTION_SHARD_SIZE", "25"))
+# "cost": shards of roughly equal estimated cost, "count": equal repo counts.
+COLLECTION_SHARDING = os.getenv("COLLECTION_SHARDING", "cost")
+
+
+def shard_repos(repos, shard_size=COLLECTION_SHARD_SIZE, costs=None):
+    """
+    Splits a repo list into ceil(len(repos) / {shard_size}) shards.
+
+    Without {costs} shards have at most {shard_size} repos, with shard
+    sizes differing by at most one. With {costs} the same number of
+    shards is packed by estimated cost instead: the most expensive repos
+    are placed first, each in the currently cheapest shard, so one huge
+    repo doesn't share its shard with many others.
+
+    Args:
+    -----
+        repos (list): Repository IDs
+        shard_size (int): Max (or, with costs, average) repos per shard
+        costs (dict | None): Repository ID -> estimated cost of collecting it
+
+    Returns:
+    --------
+        list[list]: Shards of repository IDs
+    """
+    if not repos:
+        return []
+    num_shards = -(-len(repos) // max(shard_size, 1))
+    if not costs:
+        return [repos[i::num_shards] for i in range(num_shards)]
+
+    # (cost so far, shard index) of each shard
+    heap = [(0, i) for i in range(num_shards)]
+    shards = [[] for _ in range(num_shards)]
+    for repo in sorted(repos, key=lambda r: costs.get(r, 1), reverse=True):
+        cost, i = heapq.heappop(heap)
+        shards[i].append(repo)
+        heapq.heappush(heap, (cost + costs.get(repo, 1), i))
+    return shards
+
+
+def estimate_costs(query_names, repos):
+    """
+    Estimated cost of collecting each repo for each of {query_names}, or
+    None per query when sharding by count or when there's no estimate.
+
+    A shared scan is as expensive as its first output.
+
+    Args:
+    -----
+        query_names (list[str]): Names of the queries or shared scans
+        repos (list): Repository IDs to query
+
+    Returns:
+    --------
+        dict: Query name -> (Repository ID -> cost) or None
+    """
+    cost_funcs = {
+        name: list(SHARED_SCANS[name]["outputs"])[0] if name in SHARED_SCANS else name for name in query_names
+    }
+    if COLLECTION_SHARDING != "cost" or len(repos) <= COLLECTION_SHARD_SIZE:
+        # a single shard, nothing to balance.
+        return {name: None for name in query_names}
+    try:
+        costs = cf.estimate_collection_costs(list(set(cost_funcs.values())), repos)
+    except Exception as e:
+        logging.error(f"COLLECTION COSTS UNAVAILABLE, SHARDING BY COUNT: {e}")
+        return {name: None for name in query_names}
+    return {name: costs[cost_func] for name, cost_func in cost_funcs.items()}
+
+
+def collection_units(query_names):
+    """
+    Maps query names to the units they're collected in: queries that
+    belong to a shared scan are replaced by the scan's name, once.
+
+    Args:
+    -----
+        query_names (list[str]): Names of the queries
+
+    Returns:
+    --------
+        list[str]: Query and shared scan names, in order of first appearance
+    """
+    units = []
+    for query_name in query_names:
+        unit = SHARED_SCAN_OF.get(query_name, query_name)
+        if unit not in units:
+            units.append(unit)
+    return units
+
+
+def collection_signatures(
+    query_name, repos, refresh=False, priority=COLLECTION_PRIORITY_DEFAULT, costs=None, inflight_policy=None
+):
+    """
+    Builds one collection task signature per shard of {repos}:
+    shared_scan_task for the name of a shared scan, else generic_query_task.
+
+    Args:
+    -----
+        query_name (str): Name of the query (corresponds to .sql filename) or shared scan
+        repos (list): Repository IDs to query
+        refresh (bool): Also refresh repos already cached
+        priority (int): COLLECTION_PRIORITY_* to queue at
+        costs (dict | None): Repository ID -> estimated cost, see shard_repos
+        inflight_policy (str | None): Policy for repos in flight elsewhere, see generic_query_task.
+            Not supported by shared scans.
+
+    Returns:
+    --------
+        list[Signature]: One signature per shard
+    """
+    if query_name in SHARED_SCANS:
+        task, options = shared_scan_task, {}
+    else:
+        task, options = generic_query_task, ({"inflight_policy": inflight_policy} if inflight_policy else {})
+    return [
+        task.s(query_name, shard, refresh=refresh, **options).set(priority=priority)
+        for shard in shard_repos(repos, costs=costs)
+    ]
+
+
+def dispatch_collection(
+    query_name, repos, refresh=False, priority=COLLECTION_PRIORITY_DEFAULT, inflight_policy=None
+):
+    """
+    Queues one collection task per shard of {repos}, sharded by estimated
+    cost (see estimate_costs).
+
+    Args:
+    -----
+        query_name (str): Name of the query (corresponds to .sql filename)
+        repos (list): Repository IDs to query
+        refresh (bool): Also refresh repos already cached
+        priority (int): COLLECTION_PRIORITY_* to queue at
+        inflight_policy (str | None): Policy for repos in flight elsewhere, see generic_query_task
+
+    Returns:
+    --------
+        list[AsyncResult]: One result handle per shard
+    """
+    costs = estimate_costs([query_name], repos)[query_name]
+    return [
+        signature.apply_async()
+        for signature in collection_signatures(query_name, repos, refresh, priority, costs, inflight_policy)
+    ]
+
+
+def dispatch_collection_group(query_names, repos, refresh=False, priority=COLLECTION_PRIORITY_DEFAULT):
+    """
+    Queues the collection of several queries for {repos} as one celery group.
+    {query_names} should already be collection_units, so queries sharing
+    a scan aren't collected twice.
+
+    The group is saved in the result backend, so its members can be
+    looked up by the group id alone (see group_task_states).
+
+    Args:
+    -----
+        query_names (list[str]): Names of the queries
+        repos (list): Repository IDs to query
+        refresh (bool): Also refresh repos already cached
+        priority (int): COLLECTION_PRIORITY_* to queue at
+
+    Returns:
+    --------
+        GroupResult: Members in order of {query_names}, then shards
+    """
+    costs = estimate_costs(query_names, repos)
+    group_result = group(
+        signature
+        for query_name in query_names
+        for signature in collection_signatures(query_name, repos, refresh, priority, costs[query_name])
+    ).apply_async()
+    group_result.save()
+    return group_result
+
+
+# seconds during which the same promotion isn't queued again
+COLLECTION_PROMOTION_TTL = int(os.getenv("COLLECTION_PROMOTION_TTL", "600"))
+
+
+def promote_collection(query_name, repos):
+    """
+    Queues the collection of {repos} at interactive priority, for a request
+    that's blocked on them.
+
+    Queued messages can't be re-prioritized, so the repos are queued again
+    instead. Collection is single-flight (see cache_facade.caching_wrapper):
+    whichever task runs first collects the repos, and the lower-priority
+    tasks queued earlier find them cached and finish immediately. Promoted
+    tasks skip repos another task is already collecting rather than wait
+    for it, so they never hold a worker idle.
+
+    Each repo is promoted once per COLLECTION_PROMOTION_TTL seconds,
+    however many requests are waiting on it.
+
+    Args:
+    -----
+        query_name (str): Name of the query (corresponds to .sql filename)
+        repos (list): Repository IDs a request is waiting on
+
+    Returns:
+    --------
+        list[AsyncResult]: One result handle per shard, empty if all were already promoted
+    """
+    repos = sorted(set(repos))
+    if not repos:
+        return []
+    with app.backend.client.pipeline(transaction=False) as pipe:
+        for repo in repos:
+            pipe.set(f"collection-promoted:{query_name}:{repo}", 1, nx=True, ex=COLLECTION_PROMOTION_TTL)
+        newly_promoted = [repo for repo, promoted in zip(repos, pipe.execute()) if promoted]
+    if not newly_promoted:
+        return []
+    logging.warning(f"{query_name} COLLECTION - PROMOTING {len(newly_promoted)} REPOS")
+    return dispatch_collection(
+        query_name, newly_promoted, priority=COLLECTION_PRIORITY_INTERACTIVE, inflight_policy="skip"
+    )
+
+
+def task_states(task_ids):
+    """
+    Reads the state of many tasks with one pipelined MGET against the
+    result backend, instead of a round trip per task and property.
+
+    Args:
+    -----
+        task_ids (list[str]): Task ids
+
+    Returns:
+    --------
+        list[dict]: Result meta per task ('status', 'result', ...), in order;
+            tasks without stored state are 'PENDING'.
+    """
+    backend = app.backend
+    if not task_ids:
+        return []
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    return [
+        backend.decode_result(value)
+        if value is not None
+        else {"status": "PENDING", "result": None}
+        for value in values
+    ]
+
+
+def group_task_states(group_id):
+    """
+    Reads the member ids of a saved group, then their states with task_states.
+
+    Args:
+    -----
+        group_id (str): Id of a group queued by dispatch_collection_group
+
+    Returns:
+    --------
+        list[tuple[str, dict]] | None: (task id, result meta) per member,
+            None if the group is unknown.
+    """
+    group_result = GroupResult.restore(group_id, app=app)
+    if group_result is None:
+        return None
+    task_ids = [result.id for result in group_result.results]
+    return list(zip(task_ids, task_states(task_ids)))
+
+
+def _publish_abandoned(error):
+    """
+    On a task's last attempt, tells requests waiting on the repos it
+    claimed and left uncached to stop waiting. Repos other tasks are
+    collecting aren't included, they may still be cached.
+    """
+    for func_name, repos in getattr(error, "failed", {}).items():
+        if repos:
+            publish_failed(func_name, repos)
+
 
 @app.task(
     bind=True,
@@ -42,7 +418,7 @@ sql_loader = SQLQueryLoader()
     retry_kwargs={"max_retries": 5},
     retry_jitter=True,
 )
-def generic_query_task(self, query_name, repos):
+def generic_query_task(self, query_name, repos, refresh=False, inflight_policy=None):
     """
     Generic Celery task that executes SQL queries from external files.
     
@@ -53,6 +429,9 @@ def generic_query_task(self, query_name, repos):
     -----
         query_name (str): Name of the query (corresponds to .sql filename)
         repos (list): Repository IDs to query
+        refresh (bool): Also fetch rows newer than the watermark of repos already cached
+        inflight_policy (str | None): "wait" or "skip" for repos other tasks are collecting.
+            Defaults to CACHE_INFLIGHT_POLICY.
     
     Returns:
     --------
@@ -71,7 +450,9 @@ def generic_query_task(self, query_name, repos):
         cf.caching_wrapper(
             func_name=query_name,
             query=query_string,
-            repolist=repos
+            repolist=repos,
+            refresh=refresh,
+            **({"inflight_policy": inflight_policy} if inflight_policy else {}),
         )
         
         logging.warning(f"{query_name} COLLECTION - END")
@@ -82,4 +463,133 @@ def generic_query_task(self, query_name, repos):
         raise
     except Exception as e:
         logging.error(f"Error executing query {query_name}: {e}")
-        raise
\ No newline at end of file
+        if self.request.retries >= self.retry_kwargs.get("max_retries", self.max_retries):
+            _publish_abandoned(e)
+        raise
+
+
+@app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    exponential_backoff=2,
+    retry_kwargs={"max_retries": 5},
+    retry_jitter=True,
+)
+def shared_scan_task(self, scan_name, repos, refresh=False):
+    """
+    Collects every query of a shared scan (see cache_manager/shared_scans.py)
+    with one pass over the Augur relation they all read.
+
+    Repos the scan couldn't collect (in flight elsewhere) and refreshes
+    are then handled per query, like generic_query_task does.
+
+    Args:
+    -----
+        scan_name (str): Name of the shared scan (corresponds to .sql filename)
+        repos (list): Repository IDs to query
+        refresh (bool): Also fetch rows newer than the watermark of repos already cached
+
+    Returns:
+    --------
+        int: 0 on success
+    """
+    logging.warning(f"{scan_name} SHARED SCAN - START")
+
+    if len(repos) == 0:
+        return None
+
+    func_names = list(SHARED_SCANS[scan_name]["outputs"])
+    try:
+        cf.shared_scan_wrapper(
+            scan_name=scan_name,
+            query=sql_loader.load_query(SHARED_SCANS[scan_name]["query"]),
+            repolist=repos,
+        )
+        for func_name in func_names:
+            cf.caching_wrapper(
+                func_name=func_name,
+                query=sql_loader.load_query(func_name),
+                repolist=repos,
+                refresh=refresh,
+            )
+
+        logging.warning(f"{scan_name} SHARED SCAN - END")
+        return 0
+
+    except Exception as e:
+        logging.error(f"Error executing shared scan {scan_name}: {e}")
+        if self.request.retries >= self.retry_kwargs.get("max_retries", self.max_retries):
+            _publish_abandoned(e)
+        raise
+
+
+@lru_cache(maxsize=1)
+def _augur_manager():
+    # engine is created once per worker process; the org -> repos mapping is
+    # reloaded by every prewarm run, see _load_org_repos.
+    from db_manager.augur_manager import AugurManager
+
+    augur_manager = AugurManager(handles_oauth=False)
+    augur_manager.get_engine()
+    return augur_manager
+
+
+def _load_org_repos():
+    # current org membership, so repos added to or removed from an org are picked up.
+    augur_manager = _augur_manager()
+    augur_manager.multiselect_startup()
+    return augur_manager
+
+
+@app.task
+def prewarm_cache_task(top_n=env_prewarm_top_n):
+    """
+    Periodic task that collects the {top_n} most requested selections of
+    the access log in the background, and refreshes those that are stale.
+
+    Orgs are expanded to their current repos. Everything is queued as one
+    collection group at background priority, with refresh: repos that
+    aren't cached are collected, cached ones are refreshed once they're
+    older than CACHE_REFRESH_MIN_AGE, and fresh ones are skipped.
+
+    Returns:
+    --------
+        int: Number of repos queued
+    """
+    selections = top_selections(top_n)
+    if not selections:
+        return 0
+
+    repos = set()
+    org_manager = None
+    for key, hits in selections:
+        kind, value = parse_selection(key)
+        if kind == "repos":
+            repos.update(value)
+            continue
+        try:
+            if org_manager is None:
+                org_manager = _load_org_repos()
+            repos.update(org_manager.org_to_repos(value))
+        except Exception as e:
+            logging.error(f"PREWARM - COULDN'T EXPAND ORG {value}: {e}")
+
+    repos = sorted(repos)
+    logging.warning(f"PREWARM - QUEUEING {len(repos)} REPOS OF {len(selections)} SELECTIONS")
+    dispatch_collection_group(
+        collection_units(COLLECTION_QUERIES), repos, refresh=True, priority=COLLECTION_PRIORITY_BACKGROUND
+    )
+    return len(repos)
+
+
+@app.task
+def evict_cache_task():
+    """
+    Periodic task that evicts least-recently-used cache data
+    once the cache grows past CACHE_SIZE_BUDGET_MB.
+
+    Returns:
+    --------
+        int: Number of (cache_func, repo_id) pairs evicted
+    """
+    return cf.evict_lru()
@@ -6,8 +6,11 @@ import os
 import sys
 import logging
 import json
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import asyncio
+import time
+from typing import List, Dict, Any, Literal, Optional
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -29,6 +32,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Compress responses the client accepts compressed: brotli when the optional
+# brotli-asgi package is installed (it falls back to gzip), gzip otherwise.
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # Global AugurManager instance
 augur_manager = None
 
@@ -37,6 +48,17 @@ augur_manager = None
 class RepoIdsRequest(BaseModel):
     repo_ids: List[int]
 
+class RunTasksRequest(RepoIdsRequest):
+    refresh: bool = False
+
+# response formats of the graph endpoints:
+# "html" embeddable plotly div, "plotly" compact figure JSON, "series" plotted columns only
+GraphFormat = Literal["html", "plotly", "series"]
+
+class GraphRequest(RepoIdsRequest):
+    format: GraphFormat = "html"
+    progressive: bool = False
+
 class JobIdsRequest(BaseModel):
     job_ids: List[str]
 
@@ -71,6 +93,8 @@ class TaskResult(BaseModel):
 class RunTasksResponse(BaseModel):
     message: str
     results: List[TaskResult]
+    # id of the celery group of all results, for /api/task_group_status
+    group_id: Optional[str] = None
 
 class TaskStatusInfo(BaseModel):
     job_id: str
@@ -82,8 +106,73 @@ class TaskStatusInfo(BaseModel):
 class TaskStatusResponse(BaseModel):
     results: List[TaskStatusInfo]
 
+class GroupStatusResponse(BaseModel):
+    group_id: str
+    total: int
+    completed: int
+    failed: int
+    ready: bool
+    results: List[TaskStatusInfo]
+
 class GraphResponse(BaseModel):
     graph: str
+    # fraction of the requested repos the graph doesn't include yet (progressive mode)
+    pending: float = 0.0
+
+class PoolStats(BaseModel):
+    name: str
+    pid: int
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+    reuse_ratio: float
+    avg_idle_seconds: float
+    connections_created: int
+    connections_closed: int
+    checkouts: int
+    checkouts_reused: int
+    checkout_waits: int
+    checkout_timeouts: int
+    idle_seconds_total: float
+
+class AsyncPoolStats(BaseModel):
+    name: str
+    pid: int
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+
+class WorkerPoolStats(BaseModel):
+    # unix time of the worker process's last report
+    reported_at: float
+    cache: PoolStats
+    augur: PoolStats
+    arrow: Optional[PoolStats] = None
+
+class PoolStatsResponse(BaseModel):
+    cache: PoolStats
+    augur: PoolStats
+    # ADBC connections of the columnar read path, None without the arrow extra
+    arrow: Optional[PoolStats] = None
+    # asyncpg pool of the async read path, None until the first async read
+    cache_async: Optional[AsyncPoolStats] = None
+    # pools of each celery worker process, by "hostname:pid"
+    workers: Dict[str, WorkerPoolStats] = {}
+
+class AdmissionStats(BaseModel):
+    limit: int
+    in_flight: int
+    admitted: int
+    waited: int
+    rejected: int
+    wait_seconds_total: float
+    avg_wait_seconds: float
+
+class AdmissionStatsResponse(BaseModel):
+    # query type -> admission metrics, across all workers
+    query_types: Dict[str, AdmissionStats]
 
 
 def initialize_augur_manager():
@@ -115,6 +204,30 @@ async def health_check():
     )
 
 
+@app.get('/metrics/pools', response_model=PoolStatsResponse)
+async def get_pool_stats():
+    """Connection pool metrics of this API process and of each celery worker process."""
+    from cache_manager.pools import pool_stats, worker_pool_stats
+    from cache_manager.async_cache_facade import pool_stats as async_pool_stats
+    try:
+        workers = await asyncio.to_thread(worker_pool_stats)
+    except Exception as e:
+        logging.error(f"METRICS - COULDN'T READ WORKER POOL STATS: {e}")
+        workers = {}
+    return PoolStatsResponse(**pool_stats(), cache_async=async_pool_stats(), workers=workers)
+
+
+@app.get('/metrics/admission', response_model=AdmissionStatsResponse)
+def get_admission_stats():
+    """Admission metrics of queries against Augur, per query type, across all workers."""
+    try:
+        from cache_manager.admission import admission_stats
+        return AdmissionStatsResponse(query_types=admission_stats())
+    except Exception as e:
+        logging.error(f"Error in get_admission_stats endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get('/api/data', response_model=AllDataResponse)
 async def get_all_data():
     """
@@ -200,78 +313,309 @@ async def get_all_data():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# run_tasks and get_task_status talk to Redis synchronously, so they're plain
+# functions: FastAPI runs them in its threadpool instead of on the event loop.
+# frozenset of an org's repo_ids -> org name, see selection_org
+_org_by_repos = None
+
+
+def selection_org(repo_ids):
+    """The org whose repos are exactly {repo_ids}, None if there's none."""
+    global _org_by_repos
+    if augur_manager is None:
+        return None
+    if _org_by_repos is None:
+        _org_by_repos = {
+            frozenset(repos): org for org, repos in augur_manager.org_name_to_repos_dict.items()
+        }
+    return _org_by_repos.get(frozenset(repo_ids))
+
+
 @app.post('/api/run_tasks', response_model=RunTasksResponse)
-async def run_tasks(request: RepoIdsRequest):
-    """Run all tasks against a list of repositories."""
+def run_tasks(request: RunTasksRequest):
+    """Run all tasks against a list of repositories.
+
+    With refresh, repos that are already cached are brought up to date
+    incrementally for the queries that support it.
+
+    All tasks are queued as one celery group; its id can be used to check
+    every task at once with /api/task_group_status.
+
+    The selection is recorded in the access log, so popular selections
+    are prewarmed (see celery_app.prewarm_cache_task).
+    """
     try:
-        # Import the generic task
-        from celery_app import generic_query_task
-        
-        # Define all task names
-        all_task_names = [
-            'repo_info', 'affiliation', 'commits',
-            'contributors', 'issue_assignee', 'issues',
-            'ossf_score', 'package_version', 'pr_assignee',
-            'pr_response', 'prs', 'repo_releases', 'repo_languages'
-        ]
+        # Import the sharded group dispatcher for the generic task
+        from celery_app import COLLECTION_QUERIES, collection_units, dispatch_collection_group, shard_repos
+        from cache_manager.access_log import record_selection
+
+        record_selection(request.repo_ids, org=selection_org(request.repo_ids))
+
+        # Define all task names; queries that share a scan are collected by one task
+        all_task_names = collection_units(COLLECTION_QUERIES)
         
-        # Execute all tasks using the generic task
+        # Execute all tasks using the generic task, one job per shard of the repo list
+        group_result = dispatch_collection_group(all_task_names, request.repo_ids, refresh=request.refresh)
+        num_shards = len(shard_repos(request.repo_ids))
         results = []
-        for task_name in all_task_names:
-            task_result = generic_query_task.delay(task_name, request.repo_ids)
+        for i, task_result in enumerate(group_result.results):
             results.append(TaskResult(
                 job_id=task_result.id,
                 status="queued",
-                task_name=task_name
+                task_name=all_task_names[i // num_shards]
             ))
         
         return RunTasksResponse(
             message=f"Queued {len(results)} tasks for {len(request.repo_ids)} repositories",
-            results=results
+            results=results,
+            group_id=group_result.id
         )
     except Exception as e:
         logging.error(f"Error in run_tasks endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def task_status_info(job_id: str, meta: dict) -> TaskStatusInfo:
+    """TaskStatusInfo of a job from its result backend meta."""
+    status_info = TaskStatusInfo(
+        job_id=job_id,
+        status=meta["status"],
+        ready=meta["status"] in ("SUCCESS", "FAILURE", "REVOKED")
+    )
+    if meta["status"] == "SUCCESS":
+        status_info.result = "completed"
+    elif status_info.ready:
+        status_info.error = str(meta.get("result"))
+    return status_info
+
+
 @app.post('/api/task_status', response_model=TaskStatusResponse)
-async def get_task_status(request: JobIdsRequest):
-    """Get the status of running tasks by their job IDs."""
+def get_task_status(request: JobIdsRequest):
+    """Get the status of running tasks by their job IDs.
+    All states are read with one pipelined request to the result backend.
+    """
     try:
-        from celery_app import app as celery_app
-        
-        results = []
-        for job_id in request.job_ids:
-            task_result = celery_app.AsyncResult(job_id)
-            
-            status_info = TaskStatusInfo(
-                job_id=job_id,
-                status=task_result.status,
-                ready=task_result.ready()
-            )
-            
-            if task_result.ready():
-                if task_result.successful():
-                    status_info.result = "completed"
-                else:
-                    status_info.error = str(task_result.info)
-            
-            results.append(status_info)
+        from celery_app import task_states
         
+        results = [
+            task_status_info(job_id, meta)
+            for job_id, meta in zip(request.job_ids, task_states(request.job_ids))
+        ]
         return TaskStatusResponse(results=results)
     except Exception as e:
         logging.error(f"Error in get_task_status endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get('/api/task_group_status/{group_id}', response_model=GroupStatusResponse)
+def get_task_group_status(group_id: str):
+    """Get the status of every task of a group returned by /api/run_tasks.
+    Costs two round trips to the result backend regardless of the group's size.
+    """
+    try:
+        from celery_app import group_task_states
+        
+        states = group_task_states(group_id)
+        if states is None:
+            raise HTTPException(status_code=404, detail=f"Unknown task group: {group_id}")
+        
+        results = [task_status_info(job_id, meta) for job_id, meta in states]
+        return GroupStatusResponse(
+            group_id=group_id,
+            total=len(results),
+            completed=sum(1 for r in results if r.result == "completed"),
+            failed=sum(1 for r in results if r.ready and r.result != "completed"),
+            ready=all(r.ready for r in results),
+            results=results
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error in get_task_group_status endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# seconds without a task event after which the task status stream re-reads
+# the states it's waiting on, in case an event was lost.
+TASK_STATUS_RECHECK_SECONDS = float(os.getenv("TASK_STATUS_RECHECK_SECONDS", "30"))
+
+
+@app.websocket('/ws/task_status')
+async def task_status_stream(websocket: WebSocket):
+    """Push task state transitions instead of having clients poll /api/task_status.
+
+    The client sends {"job_ids": [...]} once. The server sends the current
+    TaskStatusInfo of every job, then one TaskStatusInfo per state
+    transition as workers publish them, and closes once every job is ready.
+    """
+    await websocket.accept()
+    try:
+        request = JobIdsRequest(**await websocket.receive_json())
+        if not request.job_ids:
+            await websocket.close(code=1008, reason="job_ids must not be empty")
+            return
+        from cache_manager import readiness
+
+        # subscribe before reading the current states, so no transition in between is missed.
+        subscription = await readiness.subscribe_tasks_async(request.job_ids)
+        try:
+            pending = set(request.job_ids)
+            snapshot = request
+            next_check = 0.0
+            while pending:
+                if snapshot is not None:
+                    status = await asyncio.to_thread(get_task_status, snapshot)
+                    for info in status.results:
+                        await websocket.send_json(info.model_dump())
+                        if info.ready:
+                            pending.discard(info.job_id)
+                    snapshot = None
+                    next_check = time.monotonic() + TASK_STATUS_RECHECK_SECONDS
+                    continue
+
+                # get_message also returns None right away for subscribe confirmations,
+                # so only a deadline tells a quiet stream apart.
+                event = readiness.parse_event(
+                    await subscription.get_message(timeout=max(next_check - time.monotonic(), 0))
+                )
+                if event is None:
+                    if time.monotonic() >= next_check:
+                        # quiet for a while- re-read, which also finds out if the client left.
+                        snapshot = JobIdsRequest(job_ids=sorted(pending))
+                    continue
+                next_check = time.monotonic() + TASK_STATUS_RECHECK_SECONDS
+                await websocket.send_json(event)
+                if event["ready"]:
+                    pending.discard(event["job_id"])
+        finally:
+            await subscription.aclose()
+        await websocket.close()
+    except WebSocketDisconnect:
+        logging.info("Task status stream client disconnected")
+    except Exception as e:
+        logging.error(f"Error in task_status_stream endpoint: {str(e)}")
+        try:
+            await websocket.close(code=1011)
+        except RuntimeError:
+            # already closed
+            pass
+
+
+async def cached_graph_response(
+    visualization, cache_func, repo_ids, interval, fmt, render, response, if_none_match, progressive=False
+):
+    """Render a graph, or serve it from the figure cache.
+
+    Graphs are cached per format under their visualization, repo set,
+    interval and data version, and that key is sent as the ETag: a client
+    that already has the graph gets a 304 without it being rendered or
+    sent again. Graphs of repos that aren't cached yet are rendered but
+    not cached.
+
+    With {progressive}, the graph doesn't wait for repos that are still
+    being collected: it's rendered right away from the repos that are
+    cached, and 'pending' reports the fraction left out. Partial graphs
+    aren't cached; clients re-fetch until 'pending' is 0.
+
+    render(repo_ids, interval, fmt) returns the serialized graph. "html"
+    graphs are sent in a GraphResponse; "plotly" figures and "series" are
+    already JSON, so they're sent as-is instead of being parsed and
+    re-encoded.
+    """
+    from cache_manager.async_cache_facade import get_data_version, get_uncached
+    from cache_manager import figure_cache
+
+    repo_ids = sorted(set(repo_ids))
+    render_repos = repo_ids
+    pending = 0.0
+    if progressive and repo_ids:
+        uncached = set(await get_uncached(cache_func, repo_ids))
+        if uncached:
+            render_repos = [r for r in repo_ids if r not in uncached]
+            pending = len(uncached) / len(repo_ids)
+            logging.warning(f"{visualization} - PROGRESSIVE RENDER, {len(uncached)}/{len(repo_ids)} REPOS PENDING")
+
+    data_version = await get_data_version(cache_func, repo_ids) if not pending else None
+    key = figure_cache.figure_key(f"{visualization}:{fmt}", repo_ids, interval, data_version) if data_version else None
+
+    payload = None
+    headers = {} if not pending else {"Cache-Control": "no-store"}
+    if key is not None:
+        headers = {"ETag": figure_cache.etag(key), "Cache-Control": "no-cache"}
+        if figure_cache.etag_matches(if_none_match, key):
+            return Response(status_code=304, headers=headers)
+        payload = await asyncio.to_thread(figure_cache.get_figure, key)
+
+    if payload is None:
+        payload = await render(render_repos, interval, fmt)
+        if key is not None:
+            await asyncio.to_thread(figure_cache.put_figure, key, payload)
+
+    if fmt == "html":
+        response.headers.update(headers)
+        return GraphResponse(graph=payload, pending=pending)
+    field = "series" if fmt == "series" else "figure"
+    return Response(
+        content=f'{{"{field}":{payload},"pending":{pending}}}', media_type="application/json", headers=headers
+    )
+
+
+async def render_commits_over_time(repo_ids, interval, fmt):
+    """Serialized commits over time graph in format {fmt}."""
+    from api.commits_over_time import commits_over_time_graph_async, commits_over_time_series_async
+    from utils.graph_utils import serialize_figure
+
+    if fmt == "series":
+        series = await commits_over_time_series_async(repo_ids, interval)
+        return json.dumps(series, separators=(",", ":"))
+    fig = await commits_over_time_graph_async(repo_ids, interval)
+    return await asyncio.to_thread(serialize_figure, fig, fmt)
+
+
 @app.post('/api/commits_over_time_graph', response_model=GraphResponse)
-async def get_commits_over_time_graph(request: RepoIdsRequest):
-    """Get commits over time graph for specified repositories."""
+async def get_commits_over_time_graph(
+    request: GraphRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Get commits over time graph for specified repositories.
+
+    With format "plotly" the response is {"figure": <plotly figure JSON>},
+    with "series" it's {"series": {"x": [...], "y": [...], ...}}.
+
+    With progressive, the graph is drawn right away from the repos that
+    are cached, and "pending" is the fraction of repos still to come.
+    """
+    try:
+        return await cached_graph_response(
+            "commits_over_time", "commits", request.repo_ids, "M", request.format,
+            render_commits_over_time, response, if_none_match, progressive=request.progressive
+        )
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error in get_commits_over_time_graph endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/api/commits_over_time_graph', response_model=GraphResponse)
+async def get_commits_over_time_graph_cacheable(
+    response: Response,
+    repo_ids: List[int] = Query(...),
+    format: GraphFormat = "html",
+    progressive: bool = False,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Get commits over time graph for specified repositories.
+    Same as the POST endpoint, in a form browsers revalidate with If-None-Match on their own.
+    """
     try:
-        from api.commits_over_time import commits_over_time_graph
-        fig = commits_over_time_graph(request.repo_ids, "M")
-        data_html = fig.to_html(full_html=False, include_plotlyjs='cdn')
-        return GraphResponse(graph=data_html)
+        return await cached_graph_response(
+            "commits_over_time", "commits", repo_ids, "M", format,
+            render_commits_over_time, response, if_none_match, progressive=progressive
+        )
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logging.error(f"Error in get_commits_over_time_graph endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -286,6 +630,13 @@ async def startup_event():
         sys.exit(1)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the async cache pool on shutdown."""
+    from cache_manager.async_cache_facade import close_pool
+    await close_pool()
+
+
 if __name__ == '__main__':
     # This is for local development only
     # In Docker, we use: uvicorn api:app --host 0.0.0.0 --port 4995
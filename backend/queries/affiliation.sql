@@ -1,3 +1,7 @@
+WITH watermark AS (
+    -- per-repo lower bound for incremental refresh, NULL for a full fetch.
+    SELECT * FROM unnest(%(repo_ids)s::int[], %(since)s::timestamp[]) AS w(repo_id, since)
+)
 SELECT
     left(c.cntrb_id::text, 15), -- first 15 characters of the uuid
     timezone('utc', c.created_at) AS created_at,
@@ -13,10 +17,13 @@ JOIN contributors_aliases ca
     ON c.cntrb_id = ca.cntrb_id
 JOIN contributors con
     ON c.cntrb_id = con.cntrb_id
+JOIN watermark w
+    ON w.repo_id = c.repo_id
 WHERE
     c.repo_id = ANY(%(repo_ids)s)
     and timezone('utc', c.created_at) < now() -- created_at is a timestamptz value
     -- don't need to check non-null for created_at because it's non-null by definition.
+    and (w.since IS NULL OR timezone('utc', c.created_at) > w.since)
 GROUP BY c.cntrb_id, c.created_at, c.repo_id, c.login, c.action, c.rank, con.cntrb_company
 ORDER BY
     c.created_at 
\ No newline at end of file
@@ -1,3 +1,7 @@
+WITH watermark AS (
+    -- per-repo lower bound for incremental refresh, NULL for a full fetch.
+    SELECT * FROM unnest(%(repo_ids)s::int[], %(since)s::timestamp[]) AS w(repo_id, since)
+)
 SELECT
     distinct
     r.repo_id as repo_id,
@@ -12,8 +16,11 @@ FROM
     repo r
 JOIN commits c
     ON r.repo_id = c.repo_id
+JOIN watermark w
+    ON w.repo_id = c.repo_id
 WHERE
     c.repo_id = ANY(%(repo_ids)s)
     and timezone('utc', c.cmt_author_timestamp) < now()
     and timezone('utc', c.cmt_committer_timestamp) < now()
-    -- Above queries are always non-null so we don't have to check them. 
\ No newline at end of file
+    -- Above queries are always non-null so we don't have to check them.
+    and (w.since IS NULL OR timezone('utc', c.cmt_committer_timestamp) > w.since) 
\ No newline at end of file
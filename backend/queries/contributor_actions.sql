@@ -0,0 +1,34 @@
+-- one pass over explorer_contributor_actions for the contributors and affiliation
+-- caches, see cache_manager/shared_scans.py.
+WITH watermark AS (
+    -- per-repo lower bound for incremental refresh, NULL for a full fetch.
+    SELECT * FROM unnest(%(repo_ids)s::int[], %(since)s::timestamp[]) AS w(repo_id, since)
+)
+SELECT
+    ca.repo_id,
+    ca.repo_name,
+    left(ca.cntrb_id::text, 15) as cntrb_id, -- first 15 characters of the uuid
+    timezone('utc', ca.created_at) AS created_at,
+    ca.login,
+    ca.action,
+    ca.rank,
+    con.cntrb_company,
+    al.email_list,
+    -- affiliation only has contributors with a profile and at least one alias.
+    con.cntrb_id IS NOT NULL AND al.email_list IS NOT NULL AS affiliated
+FROM
+    explorer_contributor_actions ca
+JOIN watermark w
+    ON w.repo_id = ca.repo_id
+LEFT JOIN contributors con
+    ON ca.cntrb_id = con.cntrb_id
+LEFT JOIN LATERAL (
+    SELECT string_agg(a.alias_email, ' , ' order by a.alias_email) as email_list
+    FROM contributors_aliases a
+    WHERE a.cntrb_id = ca.cntrb_id
+) al ON true
+WHERE
+    ca.repo_id = ANY(%(repo_ids)s)
+    and timezone('utc', ca.created_at) < now() -- created_at is a timestamptz value
+    -- don't need to check non-null for created_at because it's non-null by definition.
+    and (w.since IS NULL OR timezone('utc', ca.created_at) > w.since)
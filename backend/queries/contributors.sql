@@ -1,3 +1,7 @@
+WITH watermark AS (
+    -- per-repo lower bound for incremental refresh, NULL for a full fetch.
+    SELECT * FROM unnest(%(repo_ids)s::int[], %(since)s::timestamp[]) AS w(repo_id, since)
+)
 SELECT
     ca.repo_id,
     ca.repo_name,
@@ -8,7 +12,10 @@ SELECT
     ca.rank
 FROM
     explorer_contributor_actions ca
+JOIN watermark w
+    ON w.repo_id = ca.repo_id
 WHERE
     ca.repo_id = ANY(%(repo_ids)s)
     and timezone('utc', ca.created_at) < now() -- created_at is a timestamptz value
-    -- don't need to check non-null for created_at because it's non-null by definition. 
\ No newline at end of file
+    -- don't need to check non-null for created_at because it's non-null by definition.
+    and (w.since IS NULL OR timezone('utc', ca.created_at) > w.since) 
\ No newline at end of file
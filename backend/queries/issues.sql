@@ -1,3 +1,7 @@
+WITH watermark AS (
+    -- per-repo lower bound for incremental refresh, NULL for a full fetch.
+    SELECT * FROM unnest(%(repo_ids)s::int[], %(since)s::timestamp[]) AS w(repo_id, since)
+)
 SELECT
     r.repo_id,
     r.repo_name,
@@ -11,13 +15,17 @@ SELECT
     i.closed_at
 FROM
     repo r,
-    issues i
+    issues i,
+    watermark w
 WHERE
     r.repo_id = i.repo_id AND
+    w.repo_id = i.repo_id AND
     r.repo_id = ANY(%(repo_ids)s)
     and i.pull_request_id is null
     and i.created_at < now()
     and (i.closed_at < now() or i.closed_at IS NULL)
     -- have to accept NULL values because issues could still be open, or unassigned,
     -- and still be acceptable.
+    -- a refresh re-fetches issues that were opened or closed since the watermark.
+    and (w.since IS NULL OR GREATEST(i.created_at, i.closed_at) > w.since)
 ORDER BY i.created_at 
\ No newline at end of file
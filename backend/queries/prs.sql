@@ -1,3 +1,7 @@
+WITH watermark AS (
+    -- per-repo lower bound for incremental refresh, NULL for a full fetch.
+    SELECT * FROM unnest(%(repo_ids)s::int[], %(since)s::timestamp[]) AS w(repo_id, since)
+)
 SELECT
     r.repo_id,
     r.repo_name,
@@ -10,13 +14,17 @@ SELECT
     pr.pr_merged_at AS merged
 FROM
     repo r,
-    pull_requests pr
+    pull_requests pr,
+    watermark w
 WHERE
     r.repo_id = pr.repo_id AND
+    w.repo_id = pr.repo_id AND
     r.repo_id = ANY(%(repo_ids)s)
     and pr.pr_created_at < now()
     and (pr.pr_closed_at < now() or pr.pr_closed_at IS NULL)
     and (pr.pr_merged_at < now() or pr.pr_merged_at IS NULL)
     -- have to accept NULL values because PRs could still be open, or unassigned,
     -- and still be acceptable.
+    -- a refresh re-fetches PRs that were opened, closed or merged since the watermark.
+    and (w.since IS NULL OR GREATEST(pr.pr_created_at, pr.pr_closed_at, pr.pr_merged_at) > w.since)
 ORDER BY pr.pr_created_at 
\ No newline at end of file
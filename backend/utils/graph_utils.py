@@ -1,4 +1,5 @@
 import datetime as dt
+import plotly.io as pio
 
 # list of graph color hex
 color_seq = [
@@ -65,3 +66,60 @@ def get_graph_time_values(interval):
         period = "M12"
 
     return x_r, x_name, hover, period
+
+
+def get_graph_time_window_start(interval):
+    """
+    Utility for reading only the data a visualization shows-
+    converts an 'interval' to the earliest timestamp that can land in
+    a visible time-bin of the graph, so older rows needn't be read.
+
+    The graph's range starts partway into a bin, so the start is moved
+    back by one bin to keep the first visible bin complete.
+
+    Args:
+    -----
+        interval (str | int): How long between time bins, user selected.
+
+    Returns:
+    --------
+        dt.date | None: Earliest date to read, None if all history is shown.
+    """
+    x_r, _, _, _ = get_graph_time_values(interval)
+    if x_r is None:
+        return None
+
+    # upper bound on the length of one bin, per interval
+    if interval == 86400000 or interval == "D":
+        bin_days = 1
+    elif interval == 604800000 or interval == "W":
+        bin_days = 7
+    elif interval == "M" or interval == "M1":
+        bin_days = 31
+    elif interval == "M3":
+        bin_days = 92
+    else:
+        bin_days = 183
+
+    return dt.date.fromisoformat(x_r[0]) - dt.timedelta(days=bin_days)
+
+
+def serialize_figure(fig, fmt="html"):
+    """
+    Utility for sending figures to the frontend-
+    serializes a figure in one of the formats the graph endpoints offer.
+
+    Args:
+    -----
+        fig (go.Figure): Figure to serialize.
+        fmt (str): "html" for an embeddable div that loads plotly.js from
+            the CDN, "plotly" for the compact figure JSON react-plotly takes.
+
+    Returns:
+    --------
+        str: Serialized figure.
+    """
+    if fmt == "plotly":
+        # no indentation, no validation pass; the figure was built by plotly itself.
+        return pio.to_json(fig, validate=False, pretty=False, remove_uids=True)
+    return fig.to_html(full_html=False, include_plotlyjs="cdn")
@@ -1,57 +1,58 @@
 import { NextResponse } from 'next/server';
+import WebSocket from 'ws';
 import { broadcastJobUpdate } from '../websocket/route';
 
 // Simple in-memory storage for job requests
 // In production, this would be a database table
-const jobRequests = new Map<string, { repo_ids: number[], timestamp: number, status: string, job_ids?: string[], pollInterval?: NodeJS.Timeout }>();
+const jobRequests = new Map<string, { repo_ids: number[], timestamp: number, status: string, job_ids?: string[], statusSocket?: WebSocket }>();
 
-// Background polling mechanism to check job status every 10 seconds
-async function pollJobStatusFromBackend(jobId: string, backendJobIds: string[]) {
-  const intervalId = setInterval(async () => {
+// Subscribe once to the backend's task status stream; it pushes every job's
+// current status and then each state change, so nothing has to be polled.
+function subscribeJobStatusFromBackend(jobId: string, backendJobIds: string[]) {
+  const jobStatuses = new Map<string, any>();
+  const socket = new WebSocket('ws://localhost:4995/ws/task_status');
+
+  socket.on('open', () => {
+    socket.send(JSON.stringify({ job_ids: backendJobIds }));
+  });
+
+  socket.on('message', (data) => {
     try {
-      const statusResponse = await fetch('http://localhost:4995/api/task_status', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ job_ids: backendJobIds })
-      });
-      
-      if (!statusResponse.ok) {
-        console.error(`Failed to check job status: ${statusResponse.status}`);
-        return;
-      }
-      
-      const statusResult = await statusResponse.json();
-      const allCompleted = statusResult.results?.every((r: any) => r.status === 'SUCCESS') || false;
-      
+      const update = JSON.parse(data.toString());
+      jobStatuses.set(update.job_id, update);
+      const allCompleted = backendJobIds.every((id) => jobStatuses.get(id)?.status === 'SUCCESS');
+
       // Update job request status
       const jobRequest = jobRequests.get(jobId);
       if (jobRequest) {
         if (allCompleted) {
           jobRequest.status = 'completed';
-          clearInterval(intervalId); // Stop polling when completed
-          jobRequests.set(jobId, { ...jobRequest, pollInterval: undefined });
+          jobRequests.set(jobId, { ...jobRequest, statusSocket: undefined });
         }
-        
+
         // Broadcast status update via WebSocket/SSE
         broadcastJobUpdate(jobId, {
           status: allCompleted ? 'completed' : 'loading',
           job_id: jobId,
-          job_statuses: statusResult.results,
+          job_statuses: Array.from(jobStatuses.values()),
           timestamp: new Date().toISOString()
         });
       }
-      
-      // Stop polling if job is completed or no longer tracked
+
+      // Stop listening if job is completed or no longer tracked
       if (allCompleted || !jobRequests.has(jobId)) {
-        clearInterval(intervalId);
+        socket.close();
       }
     } catch (error) {
-      console.error('Error polling job status:', error);
-      // Continue polling even if there's an error
+      console.error('Error handling job status update:', error);
     }
-  }, 10000); // Poll every 10 seconds
-  
-  return intervalId;
+  });
+
+  socket.on('error', (error) => {
+    console.error('Error in job status stream:', error);
+  });
+
+  return socket;
 }
 
 export async function POST(request: Request) {
@@ -92,8 +93,8 @@ export async function POST(request: Request) {
   // Extract job IDs from backend response
   const jobIds = backendResult.results?.map((r: any) => r.job_id) || [];
   
-  // Start background polling for this job
-  const pollInterval = await pollJobStatusFromBackend(requestKey, jobIds);
+  // Follow the status of this job's tasks
+  const statusSocket = subscribeJobStatusFromBackend(requestKey, jobIds);
   
   // Update status
   jobRequests.set(requestKey, {
@@ -101,7 +102,7 @@ export async function POST(request: Request) {
     timestamp: Date.now(),
     status: 'loading', // Keep as loading until we check individual job statuses
     job_ids: jobIds,
-    pollInterval: pollInterval
+    statusSocket: statusSocket
   });
   
   return NextResponse.json({
@@ -123,7 +124,7 @@ export async function GET(request: Request) {
   
   const jobRequest = jobRequests.get(jobId)!;
   
-  // Return current status (background polling will update this via WebSocket/SSE)
+  // Return current status (the backend status stream will update this via WebSocket/SSE)
   return NextResponse.json({
     status: jobRequest.status,
     job_id: jobId,